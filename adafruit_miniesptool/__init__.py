@@ -0,0 +1,2266 @@
+# SPDX-FileCopyrightText: 2018 ladyada for Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`adafruit_miniesptool`
+====================================================
+
+ROM loader for ESP chips, works with ESP8266, ESP32 and the chips listed in `CHIPS`.
+By default this is a 'no-stub' loader, so you can't read MD5 or firmware back
+on ESP8266. Uploading a flasher stub with `load_stub()` lifts those limits.
+
+This is the loader itself, everything a microcontroller needs. Pieces that
+only make sense on a computer, or that need asyncio, are in their own
+modules so they aren't loaded unless used: `adafruit_miniesptool.transports`
+(pyserial ports and sockets), `adafruit_miniesptool.farm` (programming many
+modules at once) and `adafruit_miniesptool.aio` (an asyncio API).
+
+See this document for protocol we're implementing:
+https://github.com/espressif/esptool/wiki/Serial-Protocol
+
+See this for the 'original' code we're miniaturizing:
+https://github.com/espressif/esptool/blob/master/esptool.py
+
+There's a very basic Arduino ROM loader here for ESP32:
+https://github.com/arduino-libraries/WiFiNINA/tree/master/examples/Tools/FirmwareUpdater
+
+* Author(s): ladyada
+
+Implementation Notes
+--------------------
+
+**Hardware:**
+
+**Software and Dependencies:**
+
+* Adafruit CircuitPython firmware for the supported boards:
+  https://github.com/adafruit/circuitpython/releases
+
+
+"""
+
+import binascii
+import json
+import os
+import struct
+import time
+
+try:
+    from digitalio import Direction
+except ImportError:
+    # Computers driving the chip through a serial port's lines don't need Blinka
+    Direction = None
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+try:
+    from hashlib import md5 as _md5
+except ImportError:
+    try:
+        from adafruit_hashlib import md5 as _md5
+    except ImportError:
+        _md5 = None
+
+__version__ = "0.0.0+auto.0"
+__repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_miniesptool.git"
+
+SYNC_PACKET = b"\x07\x07\x12 UUUUUUUUUUUUUUUUUUUUUUUUUUUUUUUU"
+ESP32_DATAREGVALUE = 0x15122500
+ESP8266_DATAREGVALUE = 0x00062000
+ESP32_C6_DATAREGVALUE = 0x2CE0806F
+ESP8266_ESP32_REG_DATA = 0x60000078
+ESP32_C6_REG_DATA = (
+    0x40001000  # from https://github.com/espressif/esptool-js/blob/main/src/esploader.ts
+)
+# Registers read to tell the chips apart: the UART date register the
+# ESP8266 and ESP32 have always been told apart by, and the chip magic
+_DETECT_REGS = (ESP8266_ESP32_REG_DATA, ESP32_C6_REG_DATA)
+
+
+# Commands supported by ESP8266 ROM bootloader
+ESP_FLASH_BEGIN = 0x02
+ESP_FLASH_DATA = 0x03
+ESP_FLASH_END = 0x04
+ESP_MEM_BEGIN = 0x05
+ESP_MEM_END = 0x06
+ESP_MEM_DATA = 0x07
+ESP_SYNC = 0x08
+ESP_WRITE_REG = 0x09
+ESP_READ_REG = 0x0A
+ESP_SPI_SET_PARAMS = 0x0B
+ESP_SPI_ATTACH = 0x0D
+ESP_READ_FLASH_SLOW = 0x0E  # ESP32 ROM only
+ESP_CHANGE_BAUDRATE = 0x0F
+ESP_FLASH_DEFL_BEGIN = 0x10
+ESP_FLASH_DEFL_DATA = 0x11
+ESP_FLASH_DEFL_END = 0x12
+ESP_SPI_FLASH_MD5 = 0x13
+ESP_ERASE_REGION = 0xD1  # Stub only
+ESP_READ_FLASH = 0xD2  # Stub only
+ESP_CHECKSUM_MAGIC = 0xEF
+
+ESP_IMAGE_MAGIC = 0xE9  # First byte of an ESP app image
+ESP8266 = 0x8266
+ESP32 = 0x32
+ESP32C6 = 0x326
+ESP32S2 = 0x3252
+ESP32S3 = 0x3253
+ESP32C3 = 0x32C3
+
+# Builds without long ints can silently drop the high bytes in int.from_bytes
+try:
+    _LONG_INTS = int.from_bytes(b"\xff" * 9, "little") == (1 << 72) - 1
+except OverflowError:
+    _LONG_INTS = False
+
+# SLIP escape sequences for the two bytes that can't appear inside a frame
+_SLIP_ESCAPES = {0xC0: b"\xdb\xdc", 0xDB: b"\xdb\xdd"}
+
+FLASH_SIZES = {
+    "512KB": 0x00,
+    "256KB": 0x10,
+    "1MB": 0x20,
+    "2MB": 0x30,
+    "4MB": 0x40,
+    "2MB-c1": 0x50,
+    "4MB-c1": 0x60,
+    "8MB": 0x80,
+    "16MB": 0x90,
+}
+
+
+class miniesptool_chip:
+    """What `miniesptool` needs to know about a chip family, one entry of
+    `CHIPS`. Supporting another chip means adding an entry there.
+
+    `signatures` are the (register, value) pairs that identify the chip,
+    read from the UART date register and the chip magic register.
+    `efuse_base` is the address of the efuse words holding the MAC, and
+    `mac_words` says which of them hold its high 16 and low 32 bits (None
+    for the ESP8266's own layout). `status_len` is the length of the ROM's
+    response status. `rom_write_size` and `stub_write_size` are the largest
+    data blocks the ROM and the flasher stub accept, `max_baud` the fastest
+    rate that works reliably and `erase_times` the typical seconds to erase
+    a sector and a 64 KB block. `rom_commands` is False if the ROM lacks
+    CHANGE_BAUDRATE, SPI_FLASH_MD5 and compressed writes, `spi_attach` if
+    the flash has to be attached before use, `rom_read_flash` if the ROM
+    has READ_FLASH_SLOW, `rom_erase_bug` for the ESP8266's FLASH_BEGIN
+    erase bug and `rom_encrypt_flag` if the ROM's FLASH_BEGIN takes an
+    encryption flag. `image_header_len` is the length of an app image
+    header, extended header included"""
+
+    def __init__(
+        self,
+        family,
+        name,
+        *,
+        signatures,
+        efuse_base,
+        mac_words=(1, 0),
+        status_len=4,
+        rom_write_size=0x400,
+        stub_write_size=0x4000,
+        max_baud=2000000,
+        erase_times=(0.045, 0.15),
+        rom_commands=True,
+        spi_attach=True,
+        rom_read_flash=False,
+        rom_erase_bug=False,
+        rom_encrypt_flag=True,
+        image_header_len=24,
+    ):
+        self.family = family
+        self.name = name
+        self.signatures = signatures
+        self.efuse_base = efuse_base
+        self.mac_words = mac_words
+        self.status_len = status_len
+        self.rom_write_size = rom_write_size
+        self.stub_write_size = stub_write_size
+        self.max_baud = max_baud
+        self.erase_times = erase_times
+        self.rom_commands = rom_commands
+        self.spi_attach = spi_attach
+        self.rom_read_flash = rom_read_flash
+        self.rom_erase_bug = rom_erase_bug
+        self.rom_encrypt_flag = rom_encrypt_flag
+        self.image_header_len = image_header_len
+
+
+# Register values and efuse addresses from esptool's targets
+CHIPS = {
+    ESP8266: miniesptool_chip(
+        ESP8266,
+        "ESP8266EX",
+        signatures=(
+            (ESP8266_ESP32_REG_DATA, ESP8266_DATAREGVALUE),
+            (ESP32_C6_REG_DATA, 0xFFF0C101),
+        ),
+        efuse_base=0x3FF00050,
+        mac_words=None,
+        status_len=2,
+        max_baud=921600,
+        erase_times=(0.05, 0.2),
+        rom_commands=False,
+        spi_attach=False,
+        rom_erase_bug=True,
+        rom_encrypt_flag=False,
+        image_header_len=8,
+    ),
+    ESP32: miniesptool_chip(
+        ESP32,
+        "ESP32",
+        signatures=((ESP8266_ESP32_REG_DATA, ESP32_DATAREGVALUE), (ESP32_C6_REG_DATA, 0x00F01D83)),
+        efuse_base=0x6001A000,
+        mac_words=(2, 1),
+        rom_read_flash=True,
+        rom_encrypt_flag=False,
+    ),
+    ESP32S2: miniesptool_chip(
+        ESP32S2,
+        "ESP32-S2",
+        signatures=((ESP32_C6_REG_DATA, 0x000007C6),),
+        efuse_base=0x3F41A044,
+    ),
+    ESP32S3: miniesptool_chip(
+        ESP32S3,
+        "ESP32-S3",
+        signatures=((ESP32_C6_REG_DATA, 0x00000009),),
+        efuse_base=0x60007044,
+    ),
+    ESP32C3: miniesptool_chip(
+        ESP32C3,
+        "ESP32-C3",
+        signatures=tuple(
+            (ESP32_C6_REG_DATA, magic) for magic in (0x6921506F, 0x1B31506F, 0x4881606F, 0x4361606F)
+        ),
+        efuse_base=0x60008844,
+    ),
+    ESP32C6: miniesptool_chip(
+        ESP32C6,
+        "ESP32-C6",
+        signatures=((ESP32_C6_REG_DATA, ESP32_C6_DATAREGVALUE),),
+        efuse_base=0x600B0844,
+    ),
+}
+
+# (register, value) to chip profile, so detecting a chip is a lookup
+_CHIP_SIGNATURES = {signature: chip for chip in CHIPS.values() for signature in chip.signatures}
+
+
+class _ImageGroup:
+    """A run of images from `miniesptool.flash_images`, presented as one
+    file with 0xFF filling any gaps between them. Supports the `seek`,
+    `read` and `readinto` calls the flash writers use"""
+
+    def __init__(self, images):
+        self._images = images  # Sorted (offset, end, filename, md5) tuples
+        self._base = images[0][0]
+        self.size = images[-1][1] - self._base
+        self._pos = 0
+        self._file = None
+        self._filename = None
+
+    def seek(self, pos):
+        """Move to `pos` bytes from the start of the first image"""
+        self._pos = pos
+
+    def readinto(self, buffer):
+        """Fill `buffer` from the current position, returns the byte count"""
+        view = memoryview(buffer)
+        count = min(len(buffer), self.size - self._pos)
+        filled = 0
+        while filled < count:
+            address = self._base + self._pos + filled
+            for offset, end, filename, _ in self._images:
+                if address < end:
+                    break
+            if address < offset:
+                # In a gap, which the flash would have erased to 0xFF anyway
+                length = min(offset - address, count - filled)
+                view[filled : filled + length] = b"\xff" * length
+            else:
+                length = min(end - address, count - filled)
+                if filename != self._filename:
+                    self.close()
+                    self._file = open(filename, "rb")
+                    self._filename = filename
+                self._file.seek(address - offset)
+                self._file.readinto(view[filled : filled + length])
+            filled += length
+        self._pos += count
+        return count
+
+    def read(self, size):
+        """Read up to `size` bytes from the current position"""
+        buffer = bytearray(min(size, self.size - self._pos))
+        self.readinto(buffer)
+        return bytes(buffer)
+
+    def close(self):
+        """Close the image file that is currently open"""
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._filename = None
+
+
+class _BufferSource:
+    """A bytes-like object presented as a file to the flash writers"""
+
+    def __init__(self, buffer):
+        self._buffer = memoryview(buffer)
+        self.size = len(self._buffer)
+        self._pos = 0
+
+    def seek(self, pos):
+        """Move to `pos` bytes from the start of the buffer"""
+        self._pos = pos
+
+    def read(self, size):
+        """Return a memoryview of the next `size` bytes, the readers only
+        need something bytes-like"""
+        view = self._buffer[self._pos : self._pos + size]
+        self._pos += len(view)
+        return view
+
+    def readinto(self, buffer):
+        """Copy the next bytes into `buffer`, returns the byte count"""
+        view = self.read(len(buffer))
+        buffer[: len(view)] = view
+        return len(view)
+
+
+class _StreamSource:
+    """`size` bytes of a stream presented as a file to the flash writers.
+    The stream can have `readinto` or `read`, or be an iterator of byte
+    chunks, and is read exactly once from start to end"""
+
+    def __init__(self, source, size):
+        self._source = source
+        self._size = size
+        self._pos = 0
+        self._chunks = None
+        self._pending = b""
+        if not hasattr(source, "readinto") and not hasattr(source, "read"):
+            self._chunks = iter(source)
+
+    def seek(self, pos):
+        """Streams can't seek, this only checks we're already at `pos`"""
+        if pos != self._pos:
+            raise ValueError("Streams can only be read once, in order")
+
+    def readinto(self, buffer):
+        """Fill `buffer` from the stream, returns the byte count"""
+        view = memoryview(buffer)
+        filled = 0
+        while filled < len(view):
+            if self._chunks is not None:
+                if not self._pending:
+                    # Iterators can yield empty chunks, only StopIteration ends them
+                    try:
+                        self._pending = memoryview(next(self._chunks))
+                    except StopIteration:
+                        break
+                    continue
+                count = min(len(self._pending), len(view) - filled)
+                view[filled : filled + count] = self._pending[:count]
+                self._pending = self._pending[count:]
+            elif hasattr(self._source, "readinto"):
+                count = self._source.readinto(view[filled:]) or 0
+            else:
+                data = self._source.read(len(view) - filled)
+                count = len(data) if data else 0
+                view[filled : filled + count] = data
+            if not count:
+                break
+            filled += count
+        self._pos += filled
+        if filled < len(view) and self._pos < self._size:
+            raise RuntimeError(f"Stream ended after {self._pos} of {self._size} bytes")
+        return filled
+
+
+class miniesptool_uart:
+    """The link to the ESP chip over a busio.UART, or anything else with
+    `baudrate`, `timeout`, `in_waiting`, `read`, `write` and
+    `reset_input_buffer` like a pyserial port. `miniesptool` wraps a UART
+    in one of these itself. Waiting for a response blocks in the UART's
+    own `read`, `READ_SLICE` at a time, rather than spinning on
+    `in_waiting`, so the CPU is free while the chip works. The UART's own
+    timeout is put back by `release()`, which `miniesptool` calls when it
+    hands the chip over to its firmware or a program loaded into RAM.
+
+    A transport only needs the same methods as this class, see
+    `adafruit_miniesptool.transports` for ones that don't wrap a UART"""
+
+    READ_SLICE = 0.01  # Seconds each blocking read waits for
+
+    def __init__(self, uart):
+        self._uart = uart
+        self._own_timeout = None  # The UART's timeout while we're using ours
+        self._sliced = False  # Whether the UART's timeout is READ_SLICE
+
+    @property
+    def baudrate(self):
+        """The baud rate of the UART"""
+        return self._uart.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baud):
+        self._uart.baudrate = baud
+
+    @property
+    def in_waiting(self):
+        """How many received bytes are waiting to be read"""
+        return self._uart.in_waiting
+
+    def read(self, size):
+        """Read up to `size` bytes that have already arrived"""
+        return self._uart.read(size)
+
+    def read_wait(self, timeout):
+        """Wait up to `timeout` seconds for data to arrive and return all
+        that has, or None if nothing did. The UART's timeout stays at
+        `READ_SLICE` and we read in slices of that until the time is up,
+        because changing it can be slow (a pyserial rfc2217 port sleeps)"""
+        if not self._sliced:
+            self._own_timeout = self._uart.timeout
+            self._uart.timeout = self.READ_SLICE
+            self._sliced = True
+        deadline = time.monotonic() + timeout
+        data = self._uart.read(1)
+        while not data:
+            if time.monotonic() >= deadline:
+                return None
+            data = self._uart.read(1)
+        waiting = self._uart.in_waiting
+        return data + self._uart.read(waiting) if waiting else data
+
+    def write(self, data):
+        """Send a whole frame in one write"""
+        return self._uart.write(data)
+
+    def reset_input_buffer(self):
+        """Throw away anything received and not read yet"""
+        self._uart.reset_input_buffer()
+
+    def release(self):
+        """Put back the timeout the UART had before we started waiting on
+        it, for code that reads from it once we're done"""
+        if self._sliced:
+            self._uart.timeout = self._own_timeout
+            self._sliced = False
+
+
+class miniesptool_stats:
+    """Performance counters for a programming session. Set an instance as
+    the `stats` of a `miniesptool` to start recording; with `stats` left
+    at None nothing is measured. Records the round trip time of every
+    command by opcode, the commands that timed out, sync and baud rate
+    retries, and how long erasing and writing flash took. Sync packets
+    the chip missed because it was still booting are counted apart from
+    retries, in `boot_syncs`. `as_dict()` returns all of it in a form that
+    can be logged or sent as JSON"""
+
+    def __init__(self):
+        self.commands = {}  # opcode: [count, total seconds, slowest seconds]
+        self.timeouts = {}  # opcode: count
+        self.retries = 0
+        self.boot_syncs = 0  # Sync packets sent while the chip was still booting
+        self.erased_bytes = 0
+        self.erase_seconds = 0
+        self.predicted_erase_seconds = 0
+        self.written_bytes = 0
+        self.write_seconds = 0
+        self.repaired_bytes = 0
+
+    def command(self, opcode, seconds):
+        """Record the round trip time of a command that got a response"""
+        entry = self.commands.get(opcode)
+        if entry is None:
+            self.commands[opcode] = [1, seconds, seconds]
+            return
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+    def timeout(self, opcode):
+        """Record a command that got no response in time"""
+        self.timeouts[opcode] = self.timeouts.get(opcode, 0) + 1
+
+    def erase(self, size, seconds, predicted=0):
+        """Record erasing `size` bytes of flash, along with how long the
+        erase plan said it should take. Flash that takes ever longer than
+        predicted is wearing out"""
+        self.erased_bytes += size
+        self.erase_seconds += seconds
+        self.predicted_erase_seconds += predicted
+
+    def write(self, size, seconds):
+        """Record writing `size` bytes of flash, not counting the erase"""
+        self.written_bytes += size
+        self.write_seconds += seconds
+
+    @property
+    def bytes_per_second(self):
+        """Average write speed, erasing excluded"""
+        return self.written_bytes / self.write_seconds if self.write_seconds else 0
+
+    def as_dict(self):
+        """All of the counters as a dict, with opcodes as hex strings"""
+        return {
+            "commands": {
+                f"0x{opcode:02x}": {
+                    "count": count,
+                    "mean_seconds": total / count,
+                    "max_seconds": slowest,
+                }
+                for opcode, (count, total, slowest) in self.commands.items()
+            },
+            "timeouts": {f"0x{opcode:02x}": count for opcode, count in self.timeouts.items()},
+            "retries": self.retries,
+            "boot_syncs": self.boot_syncs,
+            "erased_bytes": self.erased_bytes,
+            "erase_seconds": self.erase_seconds,
+            "predicted_erase_seconds": self.predicted_erase_seconds,
+            "written_bytes": self.written_bytes,
+            "write_seconds": self.write_seconds,
+            "bytes_per_second": self.bytes_per_second,
+            "repaired_bytes": self.repaired_bytes,
+        }
+
+
+class miniesptool:
+    """A miniature version of esptool, a programming command line tool for
+    ESP8266 and ESP32 chips. This version is minimized to work on CircuitPython
+    boards, so you can burn ESP firmware direct from the CPy disk drive. Handy
+    when you have an ESP module wired to a board and need to upload new AT
+    firmware. Its slow! Expect a few minutes when programming 1 MB flash."""
+
+    FLASH_WRITE_SIZE = 0x200
+    # Deprecated, block sizes come from the chip's entry in CHIPS
+    FLASH_WRITE_SIZE_C6 = CHIPS[ESP32C6].rom_write_size
+    FLASH_SECTOR_SIZE = 0x1000  # Flash sector size, minimum unit of erase.
+    FLASH_BLOCK_SIZE = 0x10000  # Flash block size, erased in one go when aligned
+    ERASE_TIMEOUT_FACTOR = 10  # Worst case erase time over the typical one
+    ESP_ROM_BAUD = 115200
+    BAUD_LADDER = (2000000, 1500000, 921600, 460800, 230400)  # Tried by auto_baudrate()
+    STUB_FLASH_WRITE_SIZE = 0x4000
+    ESP_RAM_BLOCK = 0x1800  # Largest block the ROM accepts for a RAM write
+    RX_FRAME_SIZE = 0x100  # Initial size of the decoded frame buffer, grows if needed
+    DIFF_BLOCK_SIZE = 0x10000  # Granularity of differential flashing, multiple of a sector
+    DEFAULT_TIMEOUT = 3
+    ERASE_WRITE_TIMEOUT_PER_MB = 40  # Time to erase+write one MB of flash
+    MD5_TIMEOUT_PER_MB = 8  # Time for the chip to calculate the MD5 of one MB of flash
+    BLOCK_RETRIES = 3  # Times a failed data block is sent again
+    FLASH_RESUMES = 2  # Times a failed write resyncs and carries on
+    CHECKPOINT_INTERVAL = 0x10000  # Bytes written between checkpoint saves
+    REPAIR_ROUNDS = 2  # Times sectors that fail verification are rewritten
+    SYNC_TIMEOUT = 5  # Seconds to keep trying to sync after a reset
+    SYNC_INTERVAL = 0.05  # Time to wait for a sync reply before sending another
+    REG_BATCH = 8  # READ_REG commands sent back to back, fits in the ROM's UART FIFO
+    READ_FLASH_INFLIGHT = 64  # Sectors the stub may send ahead of our acks
+    READ_FLASH_SLOW_SIZE = 64  # Bytes the ESP32 ROM returns per READ_FLASH_SLOW
+
+    def __init__(
+        self,
+        uart,
+        gpio0_pin,
+        reset_pin,
+        *,
+        flashsize,
+        baudrate=ESP_ROM_BAUD,
+    ):
+        if Direction is not None:
+            gpio0_pin.direction = Direction.OUTPUT
+            reset_pin.direction = Direction.OUTPUT
+        self._gpio0pin = gpio0_pin
+        self._resetpin = reset_pin
+        if not hasattr(uart, "read_wait"):
+            uart = miniesptool_uart(uart)
+        self._uart = uart
+        self._uart.baudrate = baudrate
+        self._rom_baud = baudrate
+        self._debug = False
+        self._efuses = [0] * 4
+        self._reg_cache = {}  # Values of registers that never change
+        self._chipfamily = None
+        self._chip = None  # The miniesptool_chip profile, once we know it
+        self._flashsize = flashsize
+        self._flash_write_size = self.FLASH_WRITE_SIZE
+        self._stub = False
+        self._stub_image = None
+        self._spi_attached = False
+        self._boot_times = []  # Reset to sync times of the last few syncs
+        self._acked = 0  # Bytes into the source the chip has acknowledged
+        self._checkpoint = None  # (path, state) of a resumable flash_file
+        self._hashing = None  # [md5, bytes hashed] of the image being written
+        self._tx_header = bytearray(24)  # Command header and data block parameters
+        self._tx_frame = bytearray(2 * (24 + self.FLASH_WRITE_SIZE) + 2)
+        self._rx = b""  # Bytes read from the UART, decoded up to _rx_pos
+        self._rx_pos = 0
+        self._rx_frame = bytearray(self.RX_FRAME_SIZE)
+        self._rx_frame_len = 0
+        self._rx_in_frame = False
+        self._rx_escaped = False
+        self._sent_at = []  # When each command still awaiting a reply went out, if timing
+        self.stats = None  # A miniesptool_stats to record timings in
+        self.progress = None  # Called with (bytes sent, total) after each block
+        # self._debug_led = DigitalInOut(board.D13)
+        # self._debug_led.direction = Direction.OUTPUT
+
+    @property
+    def debug(self):
+        """Print out all sent/received UART data plus some debugging output"""
+        return self._debug
+
+    @debug.setter
+    def debug(self, flag):
+        self._debug = flag
+
+    @property
+    def baudrate(self):
+        """The baudrate of the UART connection. On ESP8266 we cannot change
+        this once we've started syncing. On ESP32 we must start at 115200 and
+        then manually change to higher speeds if desired"""
+        return self._uart.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baud):
+        if self._limited_rom():
+            raise NotImplementedError("Baud rate can only change on ESP32 or with a stub")
+        # The stub needs to know the current rate, the ROM expects zero
+        buffer = struct.pack("<II", baud, self._uart.baudrate if self._stub else 0)
+        self.check_command(ESP_CHANGE_BAUDRATE, buffer)
+        self._uart.baudrate = baud
+        time.sleep(0.05)
+        self._uart.reset_input_buffer()
+        self.check_command(ESP_CHANGE_BAUDRATE, buffer)
+
+    def auto_baudrate(self, rates=None, *, cache=None, checks=3):
+        """Switch to the fastest baud rate the link can handle. Each of
+        `rates` (default `BAUD_LADDER`) is tried from the fastest down and
+        confirmed with `checks` register reads. If the link breaks, the
+        chip is hard reset, synced again at the ROM's rate (reloading any
+        stub) and put back on the original rate before the next rate is
+        tried. If `cache` names a file, the rate that worked is saved there
+        and tried first next time.
+        Rates above the chip's `max_baud` aren't tried. Returns the baud
+        rate in use"""
+        if self._limited_rom():
+            return self.baudrate
+        safe_baud = self.baudrate
+        rates = sorted(rates or self.BAUD_LADDER, reverse=True)
+        if self._chip is not None:
+            rates = [rate for rate in rates if rate <= self._chip.max_baud]
+        if cache:
+            try:
+                with open(cache) as file:
+                    cached = int(file.read())
+                # Start at the rate that worked last time on this wiring
+                rates = [cached] + [rate for rate in rates if rate < cached]
+            except (OSError, ValueError):
+                pass
+        expected = self.read_register(ESP8266_ESP32_REG_DATA)
+        for rate in rates:
+            if rate <= safe_baud:
+                break
+            try:
+                self.baudrate = rate
+                for _ in range(checks):
+                    if self.read_register(ESP8266_ESP32_REG_DATA) != expected:
+                        raise RuntimeError("Register read back wrong")
+            except RuntimeError as error:
+                print(f"Baud rate {rate} failed ({error}), falling back")
+                if self.stats is not None:
+                    self.stats.retries += 1
+                self._resume(safe_baud)
+                continue
+            break
+        print("Using baud rate", self.baudrate)
+        if cache:
+            try:
+                with open(cache, "w") as file:
+                    file.write(str(self.baudrate))
+            except OSError:
+                pass  # Read-only filesystem, e.g. CIRCUITPY
+        return self.baudrate
+
+    def _resync(self, baud):
+        """Hard reset the chip and sync to it again at `baud`, reloading the
+        stub if one was running"""
+        stub = self._stub_image if self._stub else None
+        self._uart.baudrate = baud
+        self.sync()
+        if stub:
+            self.load_stub(stub)
+
+    @property
+    def stub(self):
+        """True when a flasher stub uploaded with `load_stub()` is running"""
+        return self._stub
+
+    def md5(self, offset, size):
+        """On ESP32 (or any chip running a stub) we can ask the bootloader to
+        calculate an MD5 on the SPI flash memory, from a location over a size
+        in bytes. Returns a string with the MD5 in lowercase"""
+        if self._limited_rom():
+            raise NotImplementedError("MD5 only supported on ESP32 or with a stub")
+        self._spi_attach()
+        buffer = struct.pack("<IIII", offset, size, 0, 0)
+        response = self.check_command(ESP_SPI_FLASH_MD5, buffer, timeout=self._md5_timeout(size))
+        return self._md5_hex(response[1])
+
+    def _md5_timeout(self, size):
+        """How long the chip may take to calculate the MD5 of `size` bytes"""
+        return max(self.DEFAULT_TIMEOUT, self.MD5_TIMEOUT_PER_MB * size / 0x100000)
+
+    @staticmethod
+    def _md5_hex(md5):
+        """Turn the data of an SPI_FLASH_MD5 response into a hex string"""
+        if len(md5) == 16:
+            # The stub sends the raw digest instead of hex text
+            return binascii.hexlify(bytes(md5)).decode()
+        return "".join([chr(i) for i in md5])
+
+    @property
+    def mac_addr(self):
+        """The MAC address burned into the OTP memory of the ESP chip"""
+        self.chip_type
+        self._read_efuses()
+        mac_addr = [0] * 6
+        mac0, mac1, mac2, mac3 = self._efuses
+        if self._chip.mac_words is None:
+            # The ESP8266 only stores part of the OUI
+            if mac3 != 0:
+                oui = ((mac3 >> 16) & 0xFF, (mac3 >> 8) & 0xFF, mac3 & 0xFF)
+            elif ((mac1 >> 16) & 0xFF) == 0:
+                oui = (0x18, 0xFE, 0x34)
+            elif ((mac1 >> 16) & 0xFF) == 1:
+                oui = (0xAC, 0xD0, 0x74)
+            else:
+                raise RuntimeError("Couldnt determine OUI")
+
+            mac_addr[0] = oui[0]
+            mac_addr[1] = oui[1]
+            mac_addr[2] = oui[2]
+            mac_addr[3] = (mac1 >> 8) & 0xFF
+            mac_addr[4] = mac1 & 0xFF
+            mac_addr[5] = (mac0 >> 24) & 0xFF
+            return mac_addr
+        high, low = (self._efuses[i] for i in self._chip.mac_words)
+        mac_addr[0] = (high >> 8) & 0xFF
+        mac_addr[1] = high & 0xFF
+        mac_addr[2] = (low >> 24) & 0xFF
+        mac_addr[3] = (low >> 16) & 0xFF
+        mac_addr[4] = (low >> 8) & 0xFF
+        mac_addr[5] = low & 0xFF
+        return mac_addr
+
+    @property
+    def chip_type(self):
+        """Assigns ESP32, ESP32-C6, ESP8266 or another family in `CHIPS`
+        based on which chip type we're talking to"""
+        if not self._chipfamily:
+            # Both ID registers are read in one go, which is as quick as one
+            self._identify(self._read_cached(_DETECT_REGS))
+        return self._chipfamily
+
+    def _identify(self, values):
+        """Look the values of `_DETECT_REGS` up in `CHIPS` and switch to the
+        settings of the chip they identify"""
+        for signature in zip(_DETECT_REGS, values):
+            chip = _CHIP_SIGNATURES.get(signature)
+            if chip is not None:
+                break
+        else:
+            return
+        self._chip = chip
+        self._chipfamily = chip.family
+        if not self._stub:
+            self._flash_write_size = chip.rom_write_size
+
+    def _limited_rom(self):
+        """True when talking to a ROM without CHANGE_BAUDRATE, MD5 and
+        compressed writes, which a stub adds"""
+        return not self._stub and self._chip is not None and not self._chip.rom_commands
+
+    def _check_compress(self):
+        """Raise NotImplementedError before any work is done if compressed
+        writes can't be used"""
+        if self._limited_rom():
+            raise NotImplementedError("Compressed flashing only supported on ESP32 or with a stub")
+        if not hasattr(zlib, "compressobj"):
+            raise NotImplementedError("Compression requires zlib.compressobj")
+
+    @property
+    def chip_name(self):
+        """The specific name of the chip, e.g. ESP8266EX, to the best
+        of our ability to determine without a stub bootloader."""
+        self.chip_type
+        self._read_efuses()
+        return self._name_chip()
+
+    def _name_chip(self):
+        """Name the chip from its family and the efuses we've read"""
+        if self._chip is None:
+            return None
+        if self._chipfamily == ESP8266:
+            if self._efuses[0] & (1 << 4) or self._efuses[2] & (1 << 16):
+                return "ESP8285"
+        return self._chip.name
+
+    def _read_efuses(self):
+        """Read the OTP data for this chip and store into _efuses array.
+        They can't change, so this only talks to the chip the first time"""
+        self._efuses = self._read_cached(self._efuse_regs())
+
+    def _efuse_regs(self):
+        """The addresses of the efuse registers holding the MAC"""
+        base_addr = self._efuse_base()
+        return [base_addr + 4 * i for i in range(4)]
+
+    def _efuse_base(self):
+        """The address of the efuse registers holding the MAC"""
+        if self._chip is None:
+            raise RuntimeError("Don't know what chip this is")
+        return self._chip.efuse_base
+
+    def get_erase_size(self, offset, size):
+        """Calculate an erase size given a specific size in bytes.
+        Provides a workaround for the bootloader erase bug on ESP8266."""
+
+        sectors_per_block = 16
+        sector_size = self.FLASH_SECTOR_SIZE
+        num_sectors = (size + sector_size - 1) // sector_size
+        start_sector = offset // sector_size
+
+        head_sectors = sectors_per_block - (start_sector % sectors_per_block)
+        head_sectors = min(head_sectors, num_sectors)
+
+        if num_sectors < 2 * head_sectors:
+            return (num_sectors + 1) // 2 * sector_size
+        return (num_sectors - head_sectors) * sector_size
+
+    def _spi_attach(self):
+        """Attach the SPI flash and set its parameters, required on ESP32
+        before any flash command. Only done once until the next reset"""
+        if self._chip is not None and self._chip.spi_attach and not self._spi_attached:
+            self.check_command(ESP_SPI_ATTACH, bytes([0] * 8))
+            # We are hardcoded for 4MB flash on ESP32
+            buffer = struct.pack("<IIIIII", 0, self._flashsize, 0x10000, 4096, 256, 0xFFFF)
+            self.check_command(ESP_SPI_SET_PARAMS, buffer)
+            self._spi_attached = True
+
+    def _begin_buffer(self, erase_size, num_blocks, offset):
+        """Pack the parameters shared by FLASH_BEGIN and FLASH_DEFL_BEGIN"""
+        if self._chip is not None and self._chip.rom_encrypt_flag and not self._stub:
+            # Newer ROMs require a 5th parameter (the encryption flag)
+            return struct.pack("<IIIII", erase_size, num_blocks, self._flash_write_size, offset, 0)
+        return struct.pack("<IIII", erase_size, num_blocks, self._flash_write_size, offset)
+
+    def erase_plan(self, offset, size):
+        """Work out how erasing `size` bytes at `offset` breaks down into
+        sector and block erases, the way the bootloader goes about it:
+        sectors up to the first 64 KB boundary, whole blocks, then sectors
+        again. Returns (sectors, blocks, seconds), the last being the
+        typical time that takes on this chip family"""
+        if size <= 0:
+            return (0, 0, 0)
+        sector, block = self.FLASH_SECTOR_SIZE, self.FLASH_BLOCK_SIZE
+        start = offset // sector * sector
+        end = (offset + size + sector - 1) // sector * sector
+        block_start = (start + block - 1) // block * block
+        block_end = end // block * block
+        if block_end > block_start:
+            blocks = (block_end - block_start) // block
+            sectors = (block_start - start + end - block_end) // sector
+        else:
+            blocks = 0
+            sectors = (end - start) // sector
+        sector_time, block_time = (self._chip or CHIPS[ESP32]).erase_times
+        return (sectors, blocks, sectors * sector_time + blocks * block_time)
+
+    def _erase_budget(self, opcode, offset, size):
+        """Returns the predicted erase time and the timeout for a command
+        that erases `size` bytes at `offset`. The stub only erases as data
+        arrives, so its FLASH_BEGINs don't wait for any erasing"""
+        if self._stub and opcode != ESP_ERASE_REGION:
+            return (0, self.DEFAULT_TIMEOUT)
+        predicted = self.erase_plan(offset, size)[2]
+        return (predicted, self.DEFAULT_TIMEOUT + self.ERASE_TIMEOUT_FACTOR * predicted)
+
+    def _erased(self, size, stamp, predicted):
+        """Report how long an erase that started at `stamp` took"""
+        elapsed = time.monotonic() - stamp
+        print(f"Took {elapsed:.2f}s to erase {size} bytes (predicted {predicted:.2f}s)")
+        if self.stats is not None:
+            self.stats.erase(size, elapsed, predicted)
+
+    def _erasing_command(self, opcode, buffer, offset, size):
+        """Send a command that erases `size` bytes at `offset`, waiting as
+        long as the erase plan says it may take"""
+        predicted, timeout = self._erase_budget(opcode, offset, size)
+        stamp = time.monotonic()
+        self.check_command(opcode, buffer, timeout=timeout)
+        if size != 0:
+            self._erased(size, stamp, predicted)
+
+    def flash_begin(self, *, size=0, offset=0, erase_size=None):
+        """Prepare for flashing by attaching SPI chip and erasing the
+        number of blocks requred. A bigger `erase_size` erases more than
+        is about to be written, in the same go."""
+        self._spi_attach()
+
+        buffer, num_blocks = self._flash_begin_buffer(size, offset, erase_size)
+        self._erasing_command(ESP_FLASH_BEGIN, buffer, offset, erase_size or size)
+        return num_blocks
+
+    def _flash_begin_buffer(self, size, offset, erase_size=None):
+        """Work out the FLASH_BEGIN parameters, returns the packed buffer
+        and the number of blocks to send"""
+        num_blocks = (size + self._flash_write_size - 1) // self._flash_write_size
+        erase_size = erase_size or size
+        if self._chip is not None and self._chip.rom_erase_bug and not self._stub:
+            erase_size = self.get_erase_size(offset, erase_size)
+        print(
+            f"Erase size {erase_size}, num_blocks {num_blocks}, "
+            + f"size {self._flash_write_size}, offset 0x{offset:04x}"
+        )
+        return self._begin_buffer(erase_size, num_blocks, offset), num_blocks
+
+    def flash_defl_begin(self, *, size=0, compsize=0, offset=0):
+        """Prepare for compressed flashing. The ROM erases enough flash for
+        the uncompressed `size` and then expects `compsize` bytes of
+        zlib-deflated data. Not available in the ESP8266 ROM."""
+        if self._limited_rom():
+            raise NotImplementedError("Compressed flashing only supported on ESP32 or with a stub")
+        self._spi_attach()
+
+        buffer, num_blocks = self._flash_defl_begin_buffer(size, compsize, offset)
+        self._erasing_command(ESP_FLASH_DEFL_BEGIN, buffer, offset, size)
+        return num_blocks
+
+    def _flash_defl_begin_buffer(self, size, compsize, offset):
+        """Work out the FLASH_DEFL_BEGIN parameters, returns the packed
+        buffer and the number of blocks to send"""
+        num_blocks = (compsize + self._flash_write_size - 1) // self._flash_write_size
+        if self._stub:
+            erase_size = size
+        else:
+            # The ROM erases whole write blocks worth of uncompressed data
+            erase_blocks = (size + self._flash_write_size - 1) // self._flash_write_size
+            erase_size = erase_blocks * self._flash_write_size
+        print(
+            f"Erase size {erase_size}, num_blocks {num_blocks} (compressed {compsize}), "
+            + f"size {self._flash_write_size}, offset 0x{offset:04x}"
+        )
+        return self._begin_buffer(erase_size, num_blocks, offset), num_blocks
+
+    def flash_defl_finish(self, reboot=False):
+        """End a compressed flash session. The ROM leaves the bootloader
+        after this command: it reboots if `reboot` is set, otherwise it
+        runs the freshly written user code"""
+        buffer = struct.pack("<I", int(not reboot))
+        self.check_command(ESP_FLASH_DEFL_END, buffer)
+
+    def check_command(self, opcode, buffer, checksum=None, timeout=0.1):
+        """Send a command packet, check that the command succeeded and
+        return a tuple with the value and data. A precalculated `checksum`
+        of the data block is passed on to `send_command`.
+        See the ESP Serial Protocol for more details on what value/data are"""
+        self.send_command(opcode, buffer, checksum)
+        return self._check_response(opcode, timeout)
+
+    def _check_response(self, opcode, timeout=0.1):
+        """Wait for the response to a command we already sent, check its
+        status and return a tuple with the value and data"""
+        return self._check_status(*self.get_response(opcode, timeout))
+
+    def _check_status(self, value, data):
+        """Split the status off the end of a response and raise if it
+        reports a failure, returns a tuple with the value and data"""
+        if self._stub:
+            # The stub always uses the 2 byte ESP8266 style status
+            status_len = 2
+        elif self._chip is not None:
+            status_len = self._chip.status_len
+        elif data is not None and len(data) in {2, 4}:
+            status_len = len(data)
+        else:
+            # Responses that carry data use the ESP32 ROM status length
+            status_len = 4
+        if data is None or len(data) < status_len:
+            raise RuntimeError("Didn't get enough status bytes")
+        status = data[-status_len:]
+        data = data[:-status_len]
+        # print("status", status)
+        # print("value", value)
+        # print("data", data)
+        if status[0] != 0:
+            raise RuntimeError(f"Command failure error code 0x{status[1]:02x}")
+        return (value, data)
+
+    def send_command(self, opcode, buffer, checksum=None):
+        """Send a slip-encoded, checksummed command over the UART,
+        does not check response. The checksum of data blocks is calculated
+        here unless it is passed in"""
+        self._reset_input()
+
+        # self._debug_led.value = True
+        if checksum is None:
+            checksum = 0
+            if opcode in {ESP_FLASH_DATA, ESP_FLASH_DEFL_DATA, ESP_MEM_DATA}:
+                checksum = self.checksum(memoryview(buffer)[16:])
+        # self._debug_led.value = False
+        self._send_frame(opcode, buffer, checksum)
+
+    def _send_frame(self, opcode, data, checksum=0, params_len=0):
+        """Build a command packet in the preallocated TX frame and write it
+        with a single UART call. The first 8 bytes of `_tx_header` get the
+        command header, and the `params_len` bytes after it must already
+        hold any block parameters, which go on the wire ahead of `data`"""
+        header = self._tx_header
+        struct.pack_into("<BBHI", header, 0, 0x00, opcode, params_len + len(data), checksum)
+        # Worst case every byte needs escaping, plus the two delimiters
+        size = 2 * (8 + params_len + len(data)) + 2
+        if size > len(self._tx_frame):
+            self._tx_frame = bytearray(size)
+        frame = self._tx_frame
+        frame[0] = 0xC0
+        end = self._slip_encode_into(frame, 1, header, 0, 8 + params_len)
+        end = self._slip_encode_into(frame, end, data)
+        frame[end] = 0xC0
+        end += 1
+        if self._debug:
+            print("Writing:", bytes(frame[:end]))
+        if self.stats is not None:
+            self._sent_at.append(time.monotonic())
+        self._uart.write(memoryview(frame)[:end])
+
+    def _reset_input(self):
+        """Throw away anything waiting in the UART and the SLIP decoder"""
+        self._uart.reset_input_buffer()
+        self._rx = b""
+        self._rx_pos = 0
+        self._rx_frame_len = 0
+        self._rx_in_frame = False
+        self._rx_escaped = False
+        self._sent_at.clear()
+
+    def _frame_append(self, data):
+        """Copy a run of decoded bytes onto the end of the frame buffer"""
+        end = self._rx_frame_len + len(data)
+        if end > len(self._rx_frame):
+            # Grow into a new buffer, views of the old one may still be alive
+            frame = bytearray(end)
+            frame[: self._rx_frame_len] = self._rx_frame[: self._rx_frame_len]
+            self._rx_frame = frame
+        self._rx_frame[self._rx_frame_len : end] = data
+        self._rx_frame_len = end
+
+    def _decode_frame(self):
+        """Run the SLIP state machine over the received bytes we haven't
+        looked at yet. Clean runs between 0xC0/0xDB are copied in bulk.
+        Returns the length of a completed frame in the frame buffer, or
+        None once the received bytes are used up. The decoder state is kept
+        so a frame can be split across several reads"""
+        raw = self._rx
+        view = memoryview(raw)
+        pos = self._rx_pos
+        end = len(raw)
+        while pos < end:
+            if not self._rx_in_frame:
+                # packets must start with 0xC0, skip any junk before that
+                start = raw.find(b"\xc0", pos)
+                if start < 0:
+                    pos = end
+                    break
+                pos = start + 1
+                self._rx_in_frame = True
+                self._rx_escaped = False
+                self._rx_frame_len = 0
+                continue
+            if self._rx_escaped:
+                self._rx_escaped = False
+                c = raw[pos]
+                pos += 1
+                if c == 0xDD:
+                    self._frame_append(b"\xdb")
+                elif c == 0xDC:
+                    self._frame_append(b"\xc0")
+                else:
+                    self._frame_append(bytes((0xDB, c)))
+                continue
+            stop = raw.find(b"\xc0", pos)
+            if stop < 0:
+                stop = end
+            escape = raw.find(b"\xdb", pos, stop)
+            if escape >= 0:
+                self._frame_append(view[pos:escape])
+                pos = escape + 1
+                self._rx_escaped = True
+                continue
+            self._frame_append(view[pos:stop])
+            pos = stop
+            if pos == end:
+                break
+            pos += 1
+            if not self._rx_frame_len:
+                # Back to back 0xC0s, the second one starts the frame
+                continue
+            # The closing 0xC0 may also be the start of the next frame
+            # if we joined the line partway through a packet
+            length = self._rx_frame_len
+            self._rx_frame_len = 0
+            self._rx_pos = pos
+            return length
+        self._rx_pos = pos
+        return None
+
+    def _read_frame(self, timeout=0.1):
+        """Return the next complete SLIP frame as a memoryview into the
+        frame buffer, which is only valid until the next read, or None if
+        we timed out. Everything waiting in the UART is read in one go and
+        whatever is left after the frame is kept for the next call. While
+        there's nothing to decode we block in the transport's `read_wait`"""
+        stamp = time.monotonic()
+        while True:
+            frame = self._poll_frame()
+            if frame is not None:
+                return frame
+            remaining = timeout - (time.monotonic() - stamp)
+            if remaining <= 0:
+                return None
+            data = self._uart.read_wait(remaining)
+            if data:
+                self._rx = data
+                self._rx_pos = 0
+
+    def _poll_frame(self):
+        """Decode whatever has been received so far, reading what is waiting
+        in the UART if needed, without waiting for more. Returns a frame
+        like `_read_frame` or None"""
+        length = self._decode_frame()
+        if length is None:
+            waiting = self._uart.in_waiting
+            if not waiting:
+                return None
+            self._rx = self._uart.read(waiting)
+            self._rx_pos = 0
+            length = self._decode_frame()
+            if length is None:
+                return None
+        return memoryview(self._rx_frame)[:length]
+
+    def get_response(self, opcode, timeout=0.1):
+        """Read response data and decodes the slip packet, then parses
+        out the value/data and returns as a tuple of (value, data) where
+        each is a bytes object"""
+        stamp = time.monotonic()
+        while True:
+            frame = self._read_frame(max(0, timeout - (time.monotonic() - stamp)))
+            if frame is None:
+                if self._debug:
+                    print(f"Timed out after {timeout} seconds")
+                # Unanswered syncs are counted by sync(), see _sync_missed
+                if self.stats is not None and opcode != ESP_SYNC:
+                    self.stats.timeout(opcode)
+                return (None, None)
+            response = self._parse_response(frame, opcode)
+            if response:
+                return response
+
+    def _parse_response(self, frame, opcode):
+        """Return (value, data) from a decoded frame if it is a complete
+        response to `opcode`, otherwise None"""
+        if self._debug:
+            print("Reading:", bytes(frame))
+        # Skip anything that isn't a complete response to our command
+        if len(frame) < 8 or frame[0] != 0x01 or frame[1] != opcode:
+            return None
+        if len(frame) != frame[2] + (frame[3] << 8) + 8:
+            return None
+        value = bytes(frame[4:8])
+        data = bytes(frame[8:])
+        if self._debug:
+            print("value:", [hex(i) for i in value], "data:", [hex(i) for i in data])
+        if self.stats is not None and self._sent_at:
+            # Replies come back in order, so this one is for the oldest frame
+            self.stats.command(opcode, time.monotonic() - self._sent_at.pop(0))
+        return (value, data)
+
+    def read_register(self, reg):
+        """Read a register within the ESP chip RAM, returns a 4-element list"""
+        if self._debug:
+            print(f"Reading register 0x{reg:08x}")
+        packet = struct.pack("I", reg)
+        register = self.check_command(ESP_READ_REG, packet)[0]
+        return struct.unpack("I", bytearray(register))[0]
+
+    def read_registers(self, regs):
+        """Read several registers within the ESP chip, returns a list of
+        their values in the same order. The READ_REG commands are sent back
+        to back, `REG_BATCH` at a time, and the replies (which come back in
+        order) are collected afterwards, so a batch costs one round trip"""
+        values = []
+        for i in range(0, len(regs), self.REG_BATCH):
+            batch = regs[i : i + self.REG_BATCH]
+            if self._debug:
+                print("Reading registers", [f"0x{reg:08x}" for reg in batch])
+            self._reset_input()
+            for reg in batch:
+                self._send_frame(ESP_READ_REG, struct.pack("<I", reg))
+            for _ in batch:
+                values.append(struct.unpack("<I", self._check_response(ESP_READ_REG)[0])[0])
+        return values
+
+    def _read_cached(self, regs):
+        """`read_registers` for registers that never change, like efuses
+        and chip IDs. Only the ones we haven't read before are read"""
+        missing = [reg for reg in regs if reg not in self._reg_cache]
+        if missing:
+            for reg, value in zip(missing, self.read_registers(missing)):
+                self._reg_cache[reg] = value
+        return [self._reg_cache[reg] for reg in regs]
+
+    def reset(self, program_mode=False):
+        """Perform a hard-reset into ROM bootloader using gpio0 and reset.
+        Resetting to run the firmware hands the UART back as it was"""
+        self._reset_pulse(program_mode)
+        if not program_mode:
+            self._release_uart()
+        time.sleep(1.0)
+
+    def _release_uart(self):
+        """Let the transport undo anything it changed on the UART, now that
+        something else is going to be talking on it"""
+        release = getattr(self._uart, "release", None)
+        if release is not None:
+            release()
+
+    def _reset_pulse(self, program_mode):
+        """Pulse the reset pin with gpio0 set for the boot mode we want.
+        Returns the time the chip was let out of reset"""
+        print("Resetting")
+        self._forget_session()
+        self._gpio0pin.value = not program_mode
+        self._resetpin.value = False
+        time.sleep(0.1)
+        # Anything still in the UART is from before the reset
+        self._reset_input()
+        self._resetpin.value = True
+        return time.monotonic()
+
+    def _forget_session(self):
+        """Drop the state a hard reset wipes out on the chip"""
+        self._spi_attached = False
+        if self._stub:
+            # A hard reset drops us back into the ROM bootloader
+            self._stub = False
+            self._flash_write_size = self._rom_write_size()
+
+    def _rom_write_size(self):
+        """The largest data block the ROM bootloader takes"""
+        return self.FLASH_WRITE_SIZE if self._chip is None else self._chip.rom_write_size
+
+    def mem_begin(self, size, blocks, blocksize, offset):
+        """Prepare to upload `size` bytes into RAM at `offset`, sent as
+        `blocks` blocks of `blocksize` bytes each"""
+        buffer = struct.pack("<IIII", size, blocks, blocksize, offset)
+        self.check_command(ESP_MEM_BEGIN, buffer)
+
+    def mem_block(self, data, seq):
+        """Send one block of data to be written into RAM"""
+        self._data_block(ESP_MEM_DATA, data, seq)
+
+    def mem_finish(self, entrypoint=0):
+        """Finish a RAM upload and jump to `entrypoint`, if it isn't zero"""
+        buffer = struct.pack("<II", int(entrypoint == 0), entrypoint)
+        try:
+            self.check_command(ESP_MEM_END, buffer)
+        except RuntimeError:
+            # The ROM may jump to the entry point before it replies
+            if self._stub:
+                raise
+
+    def _wait_for_ohai(self, timeout=1):
+        """Wait for the greeting packet a freshly started stub sends"""
+        stamp = time.monotonic()
+        while True:
+            frame = self._read_frame(max(0, timeout - (time.monotonic() - stamp)))
+            if frame is None:
+                return False
+            if bytes(frame) == b"OHAI":
+                return True
+
+    def load_stub(self, stub):
+        """Upload a flasher stub into RAM and run it. `stub` is either the
+        filename of an esptool stub JSON file or a dict with the same
+        `text`, `text_start`, `data`, `data_start` and `entry` keys, where
+        the segments can be base64 strings or bytes. Once running, the stub
+        allows larger write blocks, MD5 checks on ESP8266 and faster baud
+        rate changes"""
+        if isinstance(stub, str):
+            with open(stub) as file:
+                stub = json.load(file)
+        self._stub_image = stub
+        print("Uploading stub")
+        for segment in ("text", "data"):
+            if segment not in stub:
+                continue
+            data = stub[segment]
+            if isinstance(data, str):
+                data = binascii.a2b_base64(data)
+            offset = stub[segment + "_start"]
+            blocks = (len(data) + self.ESP_RAM_BLOCK - 1) // self.ESP_RAM_BLOCK
+            self.mem_begin(len(data), blocks, self.ESP_RAM_BLOCK, offset)
+            for seq in range(blocks):
+                start = seq * self.ESP_RAM_BLOCK
+                self.mem_block(data[start : start + self.ESP_RAM_BLOCK], seq)
+        print("Running stub")
+        self.mem_finish(stub["entry"])
+        if not self._wait_for_ohai():
+            raise RuntimeError("Stub didn't start")
+        self._stub = True
+        self._flash_write_size = self.STUB_FLASH_WRITE_SIZE
+        if self._chip is not None:
+            self._flash_write_size = self._chip.stub_write_size
+
+    def load_ram(self, image):
+        """Load a program into IRAM/DRAM and run it, leaving the flash
+        alone. `image` is the filename of an ESP app image (.bin) or an ELF
+        file, or the same as a bytes-like object. Each segment is streamed
+        into RAM one `ESP_RAM_BLOCK` at a time, then the chip jumps to the
+        entry point, which is returned. The chip is no longer talking to us
+        after that, `sync()` to get back into the bootloader"""
+        if isinstance(image, str):
+            with open(image, "rb") as file:
+                return self._load_ram(file)
+        return self._load_ram(_BufferSource(image))
+
+    def _load_ram(self, file):
+        """Upload the segments of an open image file and jump to its entry"""
+        entry, segments = self._image_segments(file)
+        stamp = time.monotonic()
+        block = bytearray(self.ESP_RAM_BLOCK)
+        total = 0
+        for address, start, size in segments:
+            print(f"Loading {size} bytes at 0x{address:08x}")
+            blocks = (size + self.ESP_RAM_BLOCK - 1) // self.ESP_RAM_BLOCK
+            self.mem_begin(size, blocks, self.ESP_RAM_BLOCK, address)
+            file.seek(start)
+            for seq in range(blocks):
+                count = min(self.ESP_RAM_BLOCK, size - seq * self.ESP_RAM_BLOCK)
+                view = memoryview(block)[:count]
+                if file.readinto(view) != count:
+                    raise ValueError("Image is shorter than its segments")
+                self.mem_block(view, seq)
+            total += size
+        print(f"Took {time.monotonic() - stamp:.2f}s to load {total} bytes, running 0x{entry:08x}")
+        self.mem_finish(entry)
+        self._forget_session()
+        self._release_uart()
+        return entry
+
+    def _image_segments(self, file):
+        """Read the entry point and the (address, file offset, size) of each
+        segment to load from the headers of an ELF file or an ESP app
+        image, without reading the segments themselves"""
+        file.seek(0)
+        header = bytes(file.read(52))
+        segments = []
+        if header[:4] == b"\x7fELF":
+            if header[4] != 1 or header[5] != 1:
+                raise ValueError("Only 32 bit little endian ELF files can be loaded")
+            entry, phoff = struct.unpack_from("<II", header, 0x18)
+            phentsize, phnum = struct.unpack_from("<HH", header, 0x2A)
+            for i in range(phnum):
+                file.seek(phoff + i * phentsize)
+                ptype, offset, _, address, size = struct.unpack("<IIIII", file.read(20))
+                # Only PT_LOAD segments with contents, .bss is zeroed by the program
+                if ptype == 1 and size:
+                    segments.append((address, offset, size))
+            return entry, segments
+        if header[0] != ESP_IMAGE_MAGIC:
+            raise ValueError("Not an ESP app image or ELF file")
+        count, entry = header[1], struct.unpack_from("<I", header, 4)[0]
+        # The ESP32 family adds a 16 byte extended header, the ESP8266 doesn't
+        self.chip_type
+        offset = self._chip.image_header_len if self._chip else 24
+        for _ in range(count):
+            file.seek(offset)
+            address, size = struct.unpack("<II", file.read(8))
+            segments.append((address, offset + 8, size))
+            offset += 8 + size
+        return entry, segments
+
+    def _data_block(self, opcode, data, seq, timeout=0.1):
+        """Send a FLASH_DATA style block, then check the response. A block
+        that times out or is refused is sent again with the same `seq`, up
+        to `BLOCK_RETRIES` times"""
+        for attempt in range(self.BLOCK_RETRIES + 1):
+            self._send_data_block(opcode, data, seq)
+            try:
+                return self._check_response(opcode, timeout)
+            except RuntimeError:
+                if attempt == self.BLOCK_RETRIES:
+                    raise
+                if self.stats is not None:
+                    self.stats.retries += 1
+        return None
+
+    def _send_data_block(self, opcode, data, seq):
+        """Send a FLASH_DATA style block straight from `data` (which can be
+        a memoryview) without building an intermediate packet"""
+        self._reset_input()
+        struct.pack_into("<IIII", self._tx_header, 8, len(data), seq, 0, 0)
+        self._send_frame(opcode, data, self.checksum(data), 16)
+
+    def flash_block(self, data, seq, timeout=0.1):
+        """Send one block of data to program into SPI Flash memory"""
+        self._data_block(ESP_FLASH_DATA, data, seq, timeout)
+
+    def flash_defl_block(self, data, seq, timeout=0.1):
+        """Send one block of zlib-deflated data to be decompressed and
+        programmed into SPI Flash memory"""
+        self._data_block(ESP_FLASH_DEFL_DATA, data, seq, timeout)
+
+    def _raw_blocks(self, file, size, start=0):
+        """Yield the blocks that program `size` bytes of an open file,
+        starting `start` bytes into the file, with the last one padded.
+        The same buffer is reused for every block"""
+        file.seek(start)
+        block = bytearray(self._flash_write_size)
+        view = memoryview(block)
+        remaining = size
+        while remaining > 0:
+            pos = start + size - remaining
+            count = file.readinto(view[: min(len(block), remaining)])
+            self._hash_feed(pos, view[:count])
+            if count < len(block):
+                # Pad the last block
+                block[count:] = b"\xff" * (len(block) - count)
+            remaining -= len(block)
+            yield block
+
+    def _flash_file_raw(self, file, size, offset, start=0, erase_size=None):
+        """Program `size` bytes of an open file, starting `start` bytes into
+        the file, block by block, uncompressed"""
+        blocks = self.flash_begin(size=size, offset=offset, erase_size=erase_size)
+        stamp = time.monotonic()
+        last_print = time.monotonic()
+        saved = start
+        for seq, block in enumerate(self._raw_blocks(file, size, start)):
+            # Without a progress callback, only print every 10 seconds
+            if self.progress is None and time.monotonic() - last_print >= 10:
+                print(
+                    f"\rWriting at 0x{offset + seq * self._flash_write_size:08x}... "
+                    + f"({100 * (seq + 1) // blocks} %)",
+                    end="",
+                )
+                last_print = time.monotonic()
+            self.flash_block(block, seq, timeout=2)
+            self._acked = start + (seq + 1) * self._flash_write_size
+            if self._checkpoint is not None and self._acked - saved >= self.CHECKPOINT_INTERVAL:
+                # Save often enough that a crash or Ctrl-C loses little, only
+                # counting whole sectors as resuming erases the one it starts in
+                sector = (offset + self._acked - start) // self.FLASH_SECTOR_SIZE
+                saved = sector * self.FLASH_SECTOR_SIZE - offset + start
+                self._save_checkpoint(saved)
+            if self.progress is not None:
+                self.progress(min((seq + 1) * self._flash_write_size, size), size)
+        self._wrote(size, stamp)
+
+    def _wrote(self, size, stamp):
+        """Report how long writing `size` bytes took since `stamp`"""
+        print(f"Took {time.monotonic() - stamp:.2f}s to write {size} bytes")
+        if self.stats is not None:
+            self.stats.write(size, time.monotonic() - stamp)
+
+    def _deflate(self, file, size, start=0):
+        """Compress `size` bytes of a file as a stream, yielding chunks of
+        deflated data. Only one write block of the file is held in memory
+        at a time"""
+        file.seek(start)
+        compressor = zlib.compressobj(9)
+        remaining = size
+        while remaining > 0:
+            block = file.read(min(self._flash_write_size, remaining))
+            if not block:
+                break
+            self._hash_feed(start + size - remaining, block)
+            remaining -= len(block)
+            yield len(block), compressor.compress(block)
+        yield 0, compressor.flush()
+
+    def _deflated_size(self, file, size, start=0):
+        """Deflate part of a file just to learn how big it compresses"""
+        compsize = 0
+        for _, chunk in self._deflate(file, size, start):
+            compsize += len(chunk)
+        return compsize
+
+    def _deflated_blocks(self, file, size, start=0):
+        """Yield (block, timeout) pairs of deflated data to program `size`
+        bytes of an open file"""
+        pending = b""
+        consumed = 0  # uncompressed bytes represented by the pending data
+        for fed, chunk in self._deflate(file, size, start):
+            pending += chunk
+            consumed += fed
+            while len(pending) >= self._flash_write_size or (not fed and pending):
+                block = pending[: self._flash_write_size]
+                pending = pending[self._flash_write_size :]
+                # The ROM inflates and writes before it acks, so scale the
+                # timeout by how much data this block may expand into
+                timeout = max(
+                    self.DEFAULT_TIMEOUT,
+                    self.ERASE_WRITE_TIMEOUT_PER_MB * consumed / 0x100000,
+                )
+                consumed = 0
+                yield block, timeout
+
+    def _flash_file_deflated(self, file, size, offset, start=0):
+        """Compress and program `size` bytes of an open file. The data is
+        deflated twice, once to learn the compressed size the ROM needs up
+        front and once more while sending, so memory use does not depend on
+        the file size"""
+        compsize = self._deflated_size(file, size, start)
+        print(f"Compressed {size} bytes to {compsize}")
+        blocks = self.flash_defl_begin(size=size, compsize=compsize, offset=offset)
+        stamp = time.monotonic()
+        last_print = time.monotonic()
+        sent = 0
+        for seq, (block, timeout) in enumerate(self._deflated_blocks(file, size, start)):
+            if self.progress is None and time.monotonic() - last_print >= 10:
+                print(f"\rWriting block {seq + 1} of {blocks}... ", end="")
+                last_print = time.monotonic()
+            self.flash_defl_block(block, seq, timeout=timeout)
+            if self.progress is not None:
+                sent += len(block)
+                self.progress(sent, compsize)
+        self._wrote(size, stamp)
+
+    def _file_md5(self, file, size, start=0):
+        """Calculate the MD5 of `size` bytes of an open file, returned as a
+        lowercase hex string like `md5()`"""
+        if _md5 is None:
+            raise NotImplementedError("Local MD5 needs hashlib or adafruit_hashlib")
+        hasher = _md5()
+        block = bytearray(self._flash_write_size)
+        view = memoryview(block)
+        file.seek(start)
+        remaining = size
+        while remaining > 0:
+            count = file.readinto(view[: min(len(block), remaining)])
+            if not count:
+                break
+            hasher.update(view[:count])
+            self._hash_feed(start + size - remaining, view[:count])
+            remaining -= count
+        return binascii.hexlify(hasher.digest()).decode()
+
+    def _hash_start(self, verify):
+        """Start the running MD5 that `_hash_feed` adds the image to as it's
+        read for writing, if `verify` is set and the chip can check it"""
+        self._hashing = None
+        if verify and _md5 is not None and not self._limited_rom():
+            self._hashing = [_md5(), 0]
+
+    def _hash_feed(self, pos, data):
+        """Add bytes read from `pos` in the image to the running MD5, as
+        long as they're the next ones it needs. Reads of other parts, like
+        blocks sent again after a resume, are skipped"""
+        hashing = self._hashing
+        if hashing is not None and pos == hashing[1]:
+            hashing[0].update(data)
+            hashing[1] += len(data)
+
+    def _hash_finish(self, source, size):
+        """Stop the running MD5 and return it as a hex string. If the writes
+        didn't read the whole image in order (a sparse write that skipped
+        some, or a resumed checkpoint) the image is hashed again in one
+        pass. Returns None if there's nothing to verify against"""
+        hashing, self._hashing = self._hashing, None
+        if hashing is None:
+            return None
+        if hashing[1] < size:
+            if isinstance(source, _StreamSource):
+                return None
+            return self._file_md5(source, size)
+        return binascii.hexlify(hashing[0].digest()).decode()
+
+    def _verify(self, source, size, offset, md5, start=0, end=None):
+        """Check bytes `start` to `end` (all `size` by default) of a source
+        written at `offset` against an expected MD5 hex string. On a
+        mismatch the sectors that differ from the source are found with
+        `_bad_sectors` and written again, up to `REPAIR_ROUNDS` times.
+        Raises RuntimeError naming the ranges that differ if that doesn't
+        fix it, or if the source can't be read again"""
+        end = size if end is None else end
+        print("Verifying MD5sum ", md5)
+        calcd = self.md5(offset + start, end - start)
+        if md5 == calcd:
+            return
+        if isinstance(source, _StreamSource) or _md5 is None:
+            raise RuntimeError("MD5 mismatch, calculated:", calcd)
+        sector = self.FLASH_SECTOR_SIZE
+        for repairs in range(self.REPAIR_ROUNDS + 1):
+            ranges = self._bad_sectors(source, start, end, offset)
+            if not ranges or repairs == self.REPAIR_ROUNDS:
+                break
+            repaired = sum(bad_end - bad_start for bad_start, bad_end in ranges)
+            print(f"Repairing {repaired} bytes in {len(ranges)} range(s)")
+            for bad_start, bad_end in ranges:
+                # Writing erases whole sectors, so write all the source has of them
+                self._flash_range(
+                    source,
+                    max(0, (offset + bad_start) // sector * sector - offset),
+                    min(size, -(-(offset + bad_end) // sector) * sector - offset),
+                    offset,
+                )
+            if self.stats is not None:
+                self.stats.repaired_bytes += repaired
+            calcd = self.md5(offset + start, end - start)
+            if md5 == calcd:
+                print("Repaired, MD5sum matches")
+                return
+        where = "none, flash matches the source"
+        if ranges:
+            where = ", ".join(f"0x{offset + s:08x}-0x{offset + e:08x}" for s, e in ranges)
+        raise RuntimeError("MD5 mismatch, calculated:", calcd, "differs at:", where)
+
+    def _bad_sectors(self, source, start, end, offset, known_bad=False):
+        """Find the flash sectors holding bytes `start` to `end` of a source
+        that don't match it, by comparing flash MD5s with local ones and
+        splitting the range in half (on a sector boundary) while it
+        differs. Takes about two MD5 commands per level for each bad
+        sector. Returns (start, end) ranges with neighbours merged"""
+        length = end - start
+        if not known_bad:
+            local = self._file_md5(source, length, start)
+            if self.md5(offset + start, length) == local:
+                return []
+        sector = self.FLASH_SECTOR_SIZE
+        first = (offset + start) // sector
+        last = (offset + end - 1) // sector
+        if first == last:
+            return [(start, end)]
+        middle = (first + last + 1) // 2 * sector - offset
+        ranges = self._bad_sectors(source, start, middle, offset)
+        # If the first half is fine the difference must be in the second
+        for part in self._bad_sectors(source, middle, end, offset, not ranges):
+            if ranges and ranges[-1][1] == part[0]:
+                ranges[-1] = (ranges[-1][0], part[1])
+            else:
+                ranges.append(part)
+        return ranges
+
+    def _changed_ranges(self, file, size, offset):
+        """Compare MD5s of the file and of the flash one `DIFF_BLOCK_SIZE`
+        block at a time. Returns a list of (start, end) ranges of the file
+        that differ, with neighbouring changed blocks merged together"""
+        ranges = []
+        for start in range(0, size, self.DIFF_BLOCK_SIZE):
+            length = min(self.DIFF_BLOCK_SIZE, size - start)
+            if self.md5(offset + start, length) == self._file_md5(file, length, start):
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], start + length)
+            else:
+                ranges.append((start, start + length))
+        return ranges
+
+    def _flash_range(self, source, start, end, offset, compress=False, sparse=False):
+        """Program bytes `start` to `end` of a source at `offset + start`.
+        With `sparse`, stretches of 0xFF are only erased, see `_sparse_parts`.
+        If writing fails part way, the chip is reset and synced again and
+        writing carries on from the sector the failure happened in, up to
+        `FLASH_RESUMES` times. A compressed range starts over instead, as
+        the deflate stream can't be picked up in the middle"""
+        resumes = 0
+        while True:
+            self._acked = start
+            try:
+                if compress:
+                    self._flash_file_deflated(source, end - start, offset + start, start)
+                elif sparse:
+                    self._flash_file_sparse(source, start, end, offset)
+                else:
+                    self._flash_file_raw(source, end - start, offset + start, start)
+                break
+            except NotImplementedError:
+                raise  # Resyncing won't make the chip support it
+            except RuntimeError as error:
+                if not compress:
+                    # Whole sectors before the failed block are written
+                    sector = (offset + self._acked) // self.FLASH_SECTOR_SIZE
+                    start = max(start, sector * self.FLASH_SECTOR_SIZE - offset)
+                self._save_checkpoint(start)
+                if isinstance(source, _StreamSource) or resumes == self.FLASH_RESUMES:
+                    raise
+                resumes += 1
+                print(f"\nWriting failed ({error}), resuming at 0x{offset + start:08x}")
+                self._resume()
+        self._save_checkpoint(end)
+
+    def _flash_file_sparse(self, file, start, end, offset):
+        """Program bytes `start` to `end` of an open file, only erasing the
+        parts that are all 0xFF. The ROM erases everything at FLASH_BEGIN,
+        so it clears the blank part after some data in the same go, using
+        block erases across the boundary where it can"""
+        parts = self._sparse_parts(file, start, end, offset)
+        for i, (part_start, part_end, data) in enumerate(parts):
+            if data:
+                erase_end = part_end
+                if not self._stub and i + 1 < len(parts):
+                    erase_end = parts[i + 1][1]
+                self._flash_file_raw(
+                    file,
+                    part_end - part_start,
+                    offset + part_start,
+                    part_start,
+                    erase_end - part_start,
+                )
+            elif i == 0 or self._stub:
+                self._erase_region(offset + part_start, part_end - part_start)
+            self._acked = part_end
+
+    def _sparse_parts(self, file, start, end, offset):
+        """Split bytes `start` to `end` of a file into (start, end, data)
+        parts for a sparse write. Parts without data are runs of granules
+        (the bigger of a write block and a flash sector, aligned in flash)
+        that are nothing but 0xFF, which an erase alone takes care of.
+        Granules hanging over the ends of the range are always written"""
+        granule = max(self._flash_write_size, self.FLASH_SECTOR_SIZE)
+        block = bytearray(granule)
+        blank = b"\xff" * granule
+        # The first granule boundary at or after the start
+        pos = min(end, (offset + start + granule - 1) // granule * granule - offset)
+        parts = [(start, pos, True)] if pos > start else []
+        file.seek(pos)
+        while pos < end:
+            step = min(granule, end - pos)
+            data = step < granule or file.readinto(block) < granule or block != blank
+            if parts and parts[-1][2] == data:
+                parts[-1] = (parts[-1][0], pos + step, data)
+            else:
+                parts.append((pos, pos + step, data))
+            pos += step
+        return parts
+
+    def _erase_region(self, offset, size):
+        """Erase flash without writing anything after it. The stub has a
+        command for this, the ROM erases for a FLASH_BEGIN with no blocks"""
+        self._spi_attach()
+        print(f"Erasing {size} bytes of 0xFF at 0x{offset:08x}")
+        if self._stub:
+            buffer = struct.pack("<II", offset, size)
+            self._erasing_command(ESP_ERASE_REGION, buffer, offset, size)
+        else:
+            erase_size = size
+            if self._chip is not None and self._chip.rom_erase_bug:
+                erase_size = self.get_erase_size(offset, size)
+            buffer = self._begin_buffer(erase_size, 0, offset)
+            self._erasing_command(ESP_FLASH_BEGIN, buffer, offset, size)
+
+    def _resume(self, baud=None):
+        """Reset and sync again after the link failed, getting back to the
+        stub and to `baud`, by default the baud rate we were using"""
+        if baud is None:
+            baud = self.baudrate
+        self._resync(self._rom_baud)
+        if baud != self._rom_baud:
+            self.baudrate = baud
+
+    def _load_checkpoint(self, path, source, name, size, offset):
+        """Start saving flash_file progress to the checkpoint file `path`,
+        returns how many bytes an earlier run of the same write got done.
+        When the chip can calculate MD5s, that part of the flash is checked
+        against the file before we trust it"""
+        state = {"file": name, "offset": offset, "size": size, "done": 0}
+        self._checkpoint = (path, state)
+        try:
+            with open(path) as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return 0
+        if any(saved.get(key) != state[key] for key in ("file", "offset", "size")):
+            return 0
+        done = saved.get("done", 0)
+        if done and not self._limited_rom() and _md5 is not None:
+            if self.md5(offset, done) != self._file_md5(source, done):
+                print("Checkpoint doesn't match flash, starting over")
+                return 0
+        print(f"Resuming from checkpoint at 0x{offset + done:08x}")
+        return done
+
+    def _save_checkpoint(self, done):
+        """Record that the first `done` bytes of the file are written"""
+        if self._checkpoint is None:
+            return
+        path, state = self._checkpoint
+        state["done"] = max(state["done"], done)
+        try:
+            with open(path, "w") as file:
+                json.dump(state, file)
+        except OSError:
+            pass  # Read-only filesystem, e.g. CIRCUITPY
+
+    def flash_file(
+        self,
+        filename,
+        offset=0,
+        md5=None,
+        *,
+        compress=False,
+        diff=False,
+        sparse=False,
+        checkpoint=None,
+        verify=True,
+    ):
+        """Program a full binary file into SPI Flash at a given offset. If an
+        ESP32 and md5 string is passed in, will also verify memory. ESP8266
+        does not have checksum memory verification in ROM. Without an md5
+        string, the MD5 of the file is worked out as it's read for writing
+        and the flash is checked against that instead, unless `verify` is
+        False (ESP32 or stub, needs hashlib or adafruit_hashlib). On a
+        mismatch, the flash sectors that differ are found by bisecting and
+        only those are written again, up to `REPAIR_ROUNDS` times, before
+        RuntimeError is raised naming the ranges that still differ. Set `compress` to
+        deflate the file on the fly, which is much faster for images with
+        lots of padding (ESP32 only, needs `zlib.compressobj`). Set `diff` to
+        compare the file with what's already in flash, block by block, and
+        only erase and write the blocks that changed (ESP32 or stub only).
+        Set `sparse` to skip sending flash sectors that would only hold
+        0xFF, they are erased instead, which is much faster for images that
+        are mostly padding and can't be compressed (like on the ESP8266).
+        If `checkpoint` names a file, progress is saved there every
+        `CHECKPOINT_INTERVAL` bytes and when writing fails, and a later call
+        for the same file and offset picks up where a failed or interrupted
+        one stopped (compressed writes only save whole ranges). The
+        checkpoint is removed once the write is done"""
+        filesize = os.stat(filename)[6]
+        with open(filename, "rb") as file:
+            print("\nWriting", filename, "w/filesize:", filesize)
+            done = 0
+            if checkpoint:
+                done = self._load_checkpoint(checkpoint, file, filename, filesize, offset)
+            try:
+                self._flash_source(
+                    file,
+                    filesize,
+                    offset,
+                    md5,
+                    compress=compress,
+                    diff=diff,
+                    sparse=sparse,
+                    verify=verify,
+                    done=done,
+                )
+            finally:
+                self._checkpoint = None
+        if checkpoint:
+            try:
+                os.remove(checkpoint)
+            except OSError:
+                pass
+
+    def flash_buffer(
+        self, buffer, offset=0, md5=None, *, compress=False, diff=False, sparse=False, verify=True
+    ):
+        """Program the contents of a bytes-like `buffer` into SPI Flash at a
+        given offset, without going through a file. `md5`, `compress`, `diff`,
+        `sparse` and `verify` work as in `flash_file`"""
+        source = _BufferSource(buffer)
+        print("\nWriting buffer w/size:", source.size)
+        self._flash_source(
+            source,
+            source.size,
+            offset,
+            md5,
+            compress=compress,
+            diff=diff,
+            sparse=sparse,
+            verify=verify,
+        )
+
+    def flash_stream(self, source, size, offset=0, md5=None, *, verify=True):
+        """Program `size` bytes read from `source` into SPI Flash at a given
+        offset. `source` can be anything with `readinto` or `read` (an open
+        file, a socket, a response body) or an iterator of byte chunks. It
+        is read once, in order, one write block at a time, so memory use
+        stays the same however big the image is. That also means it can't
+        be compressed, diffed or written sparse. Verifies like `flash_file`,
+        the MD5 is worked out on the way through as the stream can't be
+        read again. A mismatch can't be narrowed down to a range"""
+        print("\nWriting stream w/size:", size)
+        self._flash_source(_StreamSource(source, size), size, offset, md5, verify=verify)
+
+    def _flash_source(
+        self,
+        source,
+        size,
+        offset,
+        md5=None,
+        *,
+        compress=False,
+        diff=False,
+        sparse=False,
+        verify=True,
+        done=0,
+    ):
+        """Program `size` bytes of a file-like source, see `flash_file`.
+        The first `done` bytes are already written and are skipped"""
+        if compress:
+            self._check_compress()
+        if (compress or diff or sparse) and isinstance(source, _StreamSource):
+            raise ValueError("Streams are read once, they can only be written in full")
+        if diff and offset % self.FLASH_SECTOR_SIZE:
+            raise ValueError("Differential flashing needs a sector aligned offset")
+        self._hash_start(verify and not md5)
+        try:
+            if diff:
+                stamp = time.monotonic()
+                ranges = self._changed_ranges(source, size, offset)
+                changed = sum(end - start for start, end in ranges)
+                print(
+                    f"Took {time.monotonic() - stamp:.2f}s to find {changed} "
+                    + f"changed bytes in {len(ranges)} range(s)"
+                )
+            else:
+                ranges = [(0, size)]
+            for start, end in ranges:
+                if end > done:
+                    self._flash_range(source, max(start, done), end, offset, compress, sparse)
+            md5 = md5 or self._hash_finish(source, size)
+        finally:
+            self._hashing = None
+        if md5:
+            self._verify(source, size, offset, md5)
+
+    def flash_images(self, images, *, compress=False, diff=False, sparse=False, verify=True):
+        """Program several binary files in one go. `images` is a list of
+        (offset, filename) or (offset, filename, md5) tuples, in any order.
+        The plan is checked for overlaps up front, then images that are
+        contiguous or share a flash sector are written with a single erase
+        and FLASH_BEGIN, the gap between them filled with 0xFF. All given
+        MD5s are verified together at the end, and sectors that fail are
+        written again as in `flash_file`. Unless `verify` is False, a
+        group where some image has no MD5 is checked right after it's
+        written, against the MD5 worked out while sending it. `compress`,
+        `diff` and `sparse` work as in `flash_file`, and with `sparse` the gaps between
+        images aren't sent either. Returns the number of bytes programmed"""
+        plan = []
+        for image in images:
+            offset, filename = image[0], image[1]
+            md5 = image[2] if len(image) > 2 else None
+            plan.append((offset, offset + os.stat(filename)[6], filename, md5))
+        plan.sort()
+        for previous, image in zip(plan, plan[1:]):
+            if image[0] < previous[1]:
+                raise ValueError(f"{image[2]} at 0x{image[0]:x} overlaps {previous[2]}")
+        if plan and plan[-1][1] > self._flashsize:
+            raise ValueError(f"{plan[-1][2]} doesn't fit in flash")
+        if compress:
+            self._check_compress()
+        # Erases are whole sectors, so images sharing one must go together
+        groups = []
+        for image in plan:
+            if groups:
+                # The sector boundary at or after the end of the last image
+                boundary = groups[-1][-1][1] + self.FLASH_SECTOR_SIZE - 1
+                boundary -= boundary % self.FLASH_SECTOR_SIZE
+                if image[0] <= boundary:
+                    groups[-1].append(image)
+                    continue
+            groups.append([image])
+        if diff and any(group[0][0] % self.FLASH_SECTOR_SIZE for group in groups):
+            raise ValueError("Differential flashing needs sector aligned offsets")
+
+        total = 0
+        stamp = time.monotonic()
+        for group in groups:
+            offset = group[0][0]
+            file = _ImageGroup(group)
+            try:
+                print("\nWriting", ", ".join(image[2] for image in group))
+                # Groups whose images all have MD5s are checked at the end
+                self._hash_start(verify and not all(image[3] for image in group))
+                try:
+                    ranges = [(0, file.size)]
+                    if diff:
+                        ranges = self._changed_ranges(file, file.size, offset)
+                    for start, end in ranges:
+                        self._flash_range(file, start, end, offset, compress, sparse)
+                        total += end - start
+                    md5 = self._hash_finish(file, file.size)
+                finally:
+                    self._hashing = None
+                if md5:
+                    self._verify(file, file.size, offset, md5)
+            finally:
+                file.close()
+        elapsed = time.monotonic() - stamp
+        print(
+            f"Took {elapsed:.2f}s to write {total} bytes of {len(plan)} images "
+            + f"in {len(groups)} erase/write cycles ({total / max(elapsed, 0.001):.0f} bytes/s)"
+        )
+
+        mismatched = []
+        for group in groups:
+            offset = group[0][0]
+            # Repairs rewrite whole sectors, which neighbouring images may share
+            file = _ImageGroup(group)
+            try:
+                for start, end, filename, md5 in group:
+                    if md5:
+                        print("Verifying", filename)
+                        try:
+                            self._verify(file, file.size, offset, md5, start - offset, end - offset)
+                        except RuntimeError as error:
+                            print(error)
+                            mismatched.append(filename)
+            finally:
+                file.close()
+        if mismatched:
+            raise RuntimeError("MD5 mismatch:", mismatched)
+        return total
+
+    def read_flash(self, offset, size, sink):
+        """Read `size` bytes of SPI flash at `offset` into `sink`, which can
+        be a filename, anything with a `write` method or a bytearray to
+        fill. Data is passed on as it arrives, so memory use doesn't depend
+        on the size. With a stub the flash streams back a sector at a time,
+        up to `READ_FLASH_INFLIGHT` sectors ahead of our acknowledgements.
+        Without one only the ESP32 ROM can read flash, 64 bytes per command,
+        which is slow. The data is checked against the chip's own MD5 at
+        the end if we can calculate MD5s here. Returns the MD5 as a hex
+        string, or None if it couldn't be checked"""
+        if isinstance(sink, str):
+            with open(sink, "wb") as file:
+                return self.read_flash(offset, size, file)
+        if self._stub:
+            chunks = self._read_flash_stub(offset, size)
+        elif self._chip is not None and self._chip.rom_read_flash:
+            chunks = self._read_flash_rom(offset, size)
+        else:
+            raise NotImplementedError("Reading flash needs a stub on this chip")
+        hasher = _md5() if _md5 is not None else None
+        stamp = time.monotonic()
+        received = 0
+        for chunk in chunks:
+            if hasattr(sink, "write"):
+                sink.write(chunk)
+            else:
+                sink[received : received + len(chunk)] = chunk
+            if hasher is not None:
+                hasher.update(chunk)
+            received += len(chunk)
+            if self.progress is not None:
+                self.progress(received, size)
+        print(f"Took {time.monotonic() - stamp:.2f}s to read {size} bytes")
+        if self._stub:
+            # The stub follows the data with the MD5 of what it read
+            digest = self._read_frame(self.DEFAULT_TIMEOUT)
+            if digest is None:
+                raise RuntimeError("Didn't get the MD5 of the flash read")
+            expected = self._md5_hex(bytes(digest))
+        elif hasher is not None:
+            expected = self.md5(offset, size)
+        if hasher is None:
+            return None
+        calcd = binascii.hexlify(hasher.digest()).decode()
+        if calcd != expected:
+            raise RuntimeError("MD5 mismatch reading flash, got:", calcd, "flash:", expected)
+        return calcd
+
+    def _read_flash_stub(self, offset, size):
+        """Yield the sectors the stub streams back, acking each one with the
+        total received so far so it keeps sending"""
+        self._spi_attach()
+        sector = self.FLASH_SECTOR_SIZE
+        buffer = struct.pack("<IIII", offset, size, sector, self.READ_FLASH_INFLIGHT)
+        self.check_command(ESP_READ_FLASH, buffer)
+        received = 0
+        while received < size:
+            frame = self._read_frame(self.DEFAULT_TIMEOUT)
+            if frame is None:
+                raise RuntimeError(f"Timed out reading flash at 0x{offset + received:08x}")
+            received += len(frame)
+            if received < size and len(frame) < sector:
+                raise RuntimeError(f"Short packet reading flash at 0x{offset + received:08x}")
+            # Ack before handing the data on, the stub can send meanwhile
+            self._uart.write(b"\xc0" + self.slip_encode(struct.pack("<I", received)) + b"\xc0")
+            yield frame
+
+    def _read_flash_rom(self, offset, size):
+        """Yield the flash a READ_FLASH_SLOW command at a time"""
+        self._spi_attach()
+        pos = 0
+        while pos < size:
+            length = min(self.READ_FLASH_SLOW_SIZE, size - pos)
+            buffer = struct.pack("<II", offset + pos, length)
+            data = self.check_command(ESP_READ_FLASH_SLOW, buffer)[1]
+            if len(data) < length:
+                raise RuntimeError(f"Short read of flash at 0x{offset + pos:08x}")
+            yield data[:length]
+            pos += length
+
+    def _sync(self, timeout=0.8):
+        """Perform a soft-sync using AT sync packets, does not perform
+        any hardware resetting. Waits up to `timeout` for a good reply"""
+        self.send_command(ESP_SYNC, SYNC_PACKET)
+        stamp = time.monotonic()
+        while True:
+            data = self.get_response(ESP_SYNC, max(0, timeout - (time.monotonic() - stamp)))[1]
+            if self._synced(data):
+                # The ROM answers each sync several times, take the rest now
+                for _ in range(7):
+                    if self.get_response(ESP_SYNC, 0.01)[1] is None:
+                        break
+                return True
+            if data is None:
+                return False
+
+    @staticmethod
+    def _synced(data):
+        """Check the data of a sync response for a good status"""
+        return bool(data) and len(data) > 1 and data[0] == 0 and data[1] == 0
+
+    def sync(self):
+        """Put into ROM bootload mode & attempt to synchronize with the
+        ESP ROM bootloader. Sync packets go out every `SYNC_INTERVAL` as
+        soon as the chip should be listening, going by `boot_time` or its
+        boot banner, and we keep trying for up to `SYNC_TIMEOUT` seconds"""
+        released = self._reset_pulse(True)
+        while time.monotonic() - released < self._boot_wait() and not self._uart.in_waiting:
+            time.sleep(0.01)
+        while time.monotonic() - released < self.SYNC_TIMEOUT:
+            if self._sync(self.SYNC_INTERVAL):
+                self._learn_boot_time(time.monotonic() - released)
+                # Use the biggest blocks and right parameters from the start
+                self.chip_type
+                return True
+            self._sync_missed(released)
+
+        raise RuntimeError("Couldn't sync to ESP")
+
+    def _sync_missed(self, released):
+        """Count a sync packet that got no answer, `released` seconds after
+        reset. Until the boot time learned from earlier syncs has passed
+        (and on the first sync, when there's nothing learned yet) the chip
+        is most likely still booting, which isn't a retry"""
+        if self.stats is None:
+            return
+        boot_time = self.boot_time
+        if boot_time is None or time.monotonic() - released < boot_time + self.SYNC_INTERVAL:
+            self.stats.boot_syncs += 1
+        else:
+            self.stats.retries += 1
+
+    @property
+    def boot_time(self):
+        """How soon after a reset this board answers a sync, in seconds,
+        learned from the last few syncs (None before the first one). Set it
+        to reuse a time saved from an earlier session"""
+        return min(self._boot_times) if self._boot_times else None
+
+    @boot_time.setter
+    def boot_time(self, seconds):
+        self._boot_times = [seconds]
+
+    def _learn_boot_time(self, seconds):
+        """Remember how long a sync took after reset, keeping the last 8"""
+        self._boot_times = self._boot_times[-7:] + [seconds]
+
+    def _boot_wait(self):
+        """How long to wait after reset before the first sync packet. The
+        ROM isn't listening while it boots, so syncing before then only
+        costs time; starting a little early keeps the learned time honest"""
+        if not self._boot_times:
+            return 0
+        return max(0, self.boot_time - self.SYNC_INTERVAL)
+
+    @staticmethod
+    def checksum(data, state=ESP_CHECKSUM_MAGIC):
+        """Calculate checksum of a blob, as it is defined by the ROM.
+        The whole blob is read as one integer and folded in half until a
+        single byte is left, so the XOR runs a machine word at a time"""
+        if not _LONG_INTS:
+            for b in data:
+                state ^= b
+            return state
+        length = len(data)
+        value = int.from_bytes(data, "little")
+        while length > 1:
+            half = length // 2
+            value = (value >> (8 * half)) ^ (value & ((1 << (8 * half)) - 1))
+            length -= half
+        return state ^ value
+
+    @staticmethod
+    def slip_encode(buffer):
+        """Take a bytearray buffer and return back a new bytearray where
+        0xdb is replaced with 0xdb 0xdd and 0xc0 is replaced with 0xdb 0xdc.
+        If nothing needs escaping, the common case for compressed data, the
+        buffer itself is returned"""
+        if not hasattr(buffer, "find"):
+            buffer = bytes(buffer)
+        if buffer.find(b"\xc0") < 0 and buffer.find(b"\xdb") < 0:
+            return buffer
+        if isinstance(buffer, bytes):
+            return buffer.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc")
+        encoded = bytearray(2 * len(buffer))
+        end = miniesptool._slip_encode_into(encoded, 0, buffer)
+        return encoded[:end]
+
+    @staticmethod
+    def _slip_encode_into(dest, pos, buffer, start=0, end=None):
+        """SLIP-escape `buffer[start:end]` into the bytearray `dest` starting
+        at `pos`, without allocating (memoryviews are copied once). Clean
+        runs between the bytes that need escaping are found with `find` and
+        copied in bulk. Returns the position after the last byte written"""
+        if end is None:
+            end = len(buffer)
+        if not hasattr(buffer, "find"):
+            # Memoryviews can't be searched, one copy at C speed is still
+            # far quicker than looking at every byte from Python
+            buffer = bytes(buffer[start:end])
+            start, end = 0, len(buffer)
+        view = memoryview(buffer)
+        escapes = buffer.count(b"\xc0", start, end) + buffer.count(b"\xdb", start, end)
+        if escapes > (end - start) // 64:
+            # Too many short runs to copy one by one, let replace() do it
+            encoded = bytes(view[start:end]).replace(b"\xdb", b"\xdb\xdd")
+            encoded = encoded.replace(b"\xc0", b"\xdb\xdc")
+            dest[pos : pos + len(encoded)] = encoded
+            return pos + len(encoded)
+        # Positions of the next bytes needing escapes, `end` when there are none
+        next_c0 = buffer.find(b"\xc0", start, end)
+        next_c0 = end if next_c0 < 0 else next_c0
+        next_db = buffer.find(b"\xdb", start, end)
+        next_db = end if next_db < 0 else next_db
+        while True:
+            stop = min(next_c0, next_db)
+            count = stop - start
+            if count:
+                dest[pos : pos + count] = view[start:stop]
+                pos += count
+            if stop >= end:
+                return pos
+            dest[pos : pos + 2] = _SLIP_ESCAPES[buffer[stop]]
+            pos += 2
+            start = stop + 1
+            if stop == next_c0:
+                next_c0 = buffer.find(b"\xc0", start, end)
+                next_c0 = end if next_c0 < 0 else next_c0
+            else:
+                next_db = buffer.find(b"\xdb", start, end)
+                next_db = end if next_db < 0 else next_db
@@ -0,0 +1,306 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`adafruit_miniesptool.aio`
+====================================================
+
+An asyncio API for `adafruit_miniesptool`, for boards that have other
+work to do while an ESP chip is being programmed. Needs asyncio, on
+CircuitPython that is the adafruit-circuitpython-asyncio library.
+
+* Author(s): ladyada
+"""
+
+import asyncio
+import os
+import struct
+import time
+
+from adafruit_miniesptool import (
+    _DETECT_REGS,
+    ESP_CHANGE_BAUDRATE,
+    ESP_FLASH_BEGIN,
+    ESP_FLASH_DATA,
+    ESP_FLASH_DEFL_BEGIN,
+    ESP_FLASH_DEFL_DATA,
+    ESP_READ_REG,
+    ESP_SPI_ATTACH,
+    ESP_SPI_FLASH_MD5,
+    ESP_SPI_SET_PARAMS,
+    ESP_SYNC,
+    SYNC_PACKET,
+    miniesptool,
+)
+
+
+class miniesptool_async:
+    """An asyncio version of `miniesptool`, for boards that have other work
+    to do while an ESP chip is being programmed. Waiting for responses and
+    resets yields to the event loop instead of spinning, so several of
+    these can also program modules at the same time. The blocking
+    `miniesptool` this wraps is available as `esptool` for anything not
+    covered here, such as `load_stub()`"""
+
+    def __init__(
+        self,
+        uart,
+        gpio0_pin,
+        reset_pin,
+        *,
+        flashsize,
+        baudrate=miniesptool.ESP_ROM_BAUD,
+    ):
+        self.esptool = miniesptool(
+            uart, gpio0_pin, reset_pin, flashsize=flashsize, baudrate=baudrate
+        )
+        self._chipname = None
+
+    @property
+    def chip_name(self):
+        """The chip name found by `detect()`"""
+        return self._chipname
+
+    @property
+    def mac_addr(self):
+        """The MAC address burned into the OTP memory of the ESP chip,
+        available after `detect()`"""
+        return self.esptool.mac_addr
+
+    async def reset(self, program_mode=False):
+        """Perform a hard-reset into ROM bootloader using gpio0 and reset"""
+        await self._reset_pulse(program_mode)
+        await asyncio.sleep(1.0)
+
+    async def _reset_pulse(self, program_mode):
+        """Pulse the reset pin, returns the time the chip was let go"""
+        esp = self.esptool
+        print("Resetting")
+        esp._forget_session()
+        esp._gpio0pin.value = not program_mode
+        esp._resetpin.value = False
+        await asyncio.sleep(0.1)
+        esp._reset_input()
+        esp._resetpin.value = True
+        return time.monotonic()
+
+    async def sync(self):
+        """Put into ROM bootload mode & attempt to synchronize with the
+        ESP ROM bootloader, with the same timing as `miniesptool.sync`"""
+        esp = self.esptool
+        released = await self._reset_pulse(True)
+        while time.monotonic() - released < esp._boot_wait() and not esp._uart.in_waiting:
+            await asyncio.sleep(0.01)
+        while time.monotonic() - released < esp.SYNC_TIMEOUT:
+            esp.send_command(ESP_SYNC, SYNC_PACKET)
+            stamp = time.monotonic()
+            while True:
+                timeout = max(0, esp.SYNC_INTERVAL - (time.monotonic() - stamp))
+                data = (await self.get_response(ESP_SYNC, timeout))[1]
+                if esp._synced(data):
+                    for _ in range(7):
+                        if (await self.get_response(ESP_SYNC, 0.01))[1] is None:
+                            break
+                    esp._learn_boot_time(time.monotonic() - released)
+                    await self._detect_family()
+                    return True
+                if data is None:
+                    break
+            esp._sync_missed(released)
+        raise RuntimeError("Couldn't sync to ESP")
+
+    async def get_response(self, opcode, timeout=0.1):
+        """Wait for the response to `opcode`, returns (value, data) or
+        (None, None) if we timed out"""
+        esp = self.esptool
+        stamp = time.monotonic()
+        while (time.monotonic() - stamp) < timeout:
+            frame = esp._poll_frame()
+            if frame is None:
+                await asyncio.sleep(0)
+                continue
+            response = esp._parse_response(frame, opcode)
+            if response:
+                return response
+        if esp.stats is not None and opcode != ESP_SYNC:
+            esp.stats.timeout(opcode)
+        return (None, None)
+
+    async def check_command(self, opcode, buffer, checksum=None, timeout=0.1):
+        """Send a command packet, check that the command succeeded and
+        return a tuple with the value and data"""
+        self.esptool.send_command(opcode, buffer, checksum)
+        return self.esptool._check_status(*(await self.get_response(opcode, timeout)))
+
+    async def read_register(self, reg):
+        """Read a register within the ESP chip RAM"""
+        register = (await self.check_command(ESP_READ_REG, struct.pack("I", reg)))[0]
+        return struct.unpack("I", register)[0]
+
+    async def read_registers(self, regs):
+        """Read several registers in batches, see `miniesptool.read_registers`"""
+        esp = self.esptool
+        values = []
+        for i in range(0, len(regs), esp.REG_BATCH):
+            batch = regs[i : i + esp.REG_BATCH]
+            esp._reset_input()
+            for reg in batch:
+                esp._send_frame(ESP_READ_REG, struct.pack("<I", reg))
+            for _ in batch:
+                value = esp._check_status(*(await self.get_response(ESP_READ_REG)))[0]
+                values.append(struct.unpack("<I", value)[0])
+        return values
+
+    async def _read_cached(self, regs):
+        """Read registers that never change, through the shared cache"""
+        esp = self.esptool
+        missing = [reg for reg in regs if reg not in esp._reg_cache]
+        if missing:
+            for reg, value in zip(missing, await self.read_registers(missing)):
+                esp._reg_cache[reg] = value
+        return [esp._reg_cache[reg] for reg in regs]
+
+    async def detect(self):
+        """Find out which chip we're talking to and read its efuses,
+        returns the chip name"""
+        esp = self.esptool
+        await self._detect_family()
+        esp._efuses = await self._read_cached(esp._efuse_regs())
+        self._chipname = esp._name_chip()
+        return self._chipname
+
+    async def _detect_family(self):
+        """Identify the chip and switch to its settings, see `miniesptool.chip_type`"""
+        esp = self.esptool
+        if not esp._chipfamily:
+            esp._identify(await self._read_cached(_DETECT_REGS))
+
+    async def set_baudrate(self, baud):
+        """Change the baud rate, like setting `miniesptool.baudrate`"""
+        esp = self.esptool
+        if esp._limited_rom():
+            raise NotImplementedError("Baud rate can only change on ESP32 or with a stub")
+        buffer = struct.pack("<II", baud, esp._uart.baudrate if esp._stub else 0)
+        await self.check_command(ESP_CHANGE_BAUDRATE, buffer)
+        esp._uart.baudrate = baud
+        await asyncio.sleep(0.05)
+        esp._uart.reset_input_buffer()
+        await self.check_command(ESP_CHANGE_BAUDRATE, buffer)
+
+    async def _spi_attach(self):
+        """Attach the SPI flash once per reset, see `miniesptool._spi_attach`"""
+        esp = self.esptool
+        if esp._chip is not None and esp._chip.spi_attach and not esp._spi_attached:
+            await self.check_command(ESP_SPI_ATTACH, bytes([0] * 8))
+            buffer = struct.pack("<IIIIII", 0, esp._flashsize, 0x10000, 4096, 256, 0xFFFF)
+            await self.check_command(ESP_SPI_SET_PARAMS, buffer)
+            esp._spi_attached = True
+
+    async def md5(self, offset, size):
+        """Ask the bootloader for the MD5 of part of the SPI flash, returns
+        a string with the MD5 in lowercase"""
+        esp = self.esptool
+        if esp._limited_rom():
+            raise NotImplementedError("MD5 only supported on ESP32 or with a stub")
+        await self._spi_attach()
+        buffer = struct.pack("<IIII", offset, size, 0, 0)
+        timeout = esp._md5_timeout(size)
+        return esp._md5_hex((await self.check_command(ESP_SPI_FLASH_MD5, buffer, timeout))[1])
+
+    async def flash_begin(self, *, size=0, offset=0):
+        """Prepare for flashing by attaching SPI chip and erasing the
+        number of blocks required"""
+        await self._spi_attach()
+        buffer, num_blocks = self.esptool._flash_begin_buffer(size, offset)
+        await self._erasing_command(ESP_FLASH_BEGIN, buffer, offset, size)
+        return num_blocks
+
+    async def _erasing_command(self, opcode, buffer, offset, size):
+        """Send a command that erases flash, see `miniesptool.erase_plan`"""
+        predicted, timeout = self.esptool._erase_budget(opcode, offset, size)
+        stamp = time.monotonic()
+        await self.check_command(opcode, buffer, timeout=timeout)
+        if size != 0:
+            self.esptool._erased(size, stamp, predicted)
+
+    async def flash_defl_begin(self, *, size=0, compsize=0, offset=0):
+        """Prepare for compressed flashing, see `miniesptool.flash_defl_begin`"""
+        esp = self.esptool
+        if esp._limited_rom():
+            raise NotImplementedError("Compressed flashing only supported on ESP32 or with a stub")
+        await self._spi_attach()
+        buffer, num_blocks = esp._flash_defl_begin_buffer(size, compsize, offset)
+        await self._erasing_command(ESP_FLASH_DEFL_BEGIN, buffer, offset, size)
+        return num_blocks
+
+    async def _data_block(self, opcode, data, seq, timeout=0.1):
+        """Send a FLASH_DATA style block, then check the response. Failed
+        blocks are sent again like `miniesptool._data_block` does"""
+        esp = self.esptool
+        for attempt in range(esp.BLOCK_RETRIES + 1):
+            esp._send_data_block(opcode, data, seq)
+            try:
+                return esp._check_status(*(await self.get_response(opcode, timeout)))
+            except RuntimeError:
+                if attempt == esp.BLOCK_RETRIES:
+                    raise
+                if esp.stats is not None:
+                    esp.stats.retries += 1
+        return None
+
+    async def flash_block(self, data, seq, timeout=0.1):
+        """Send one block of data to program into SPI Flash memory"""
+        await self._data_block(ESP_FLASH_DATA, data, seq, timeout)
+
+    async def flash_defl_block(self, data, seq, timeout=0.1):
+        """Send one block of zlib-deflated data to program into SPI Flash"""
+        await self._data_block(ESP_FLASH_DEFL_DATA, data, seq, timeout)
+
+    async def flash_file(self, filename, offset=0, md5=None, *, compress=False, verify=True):
+        """Program a full binary file into SPI Flash at a given offset,
+        optionally compressed, and verified against an md5 string or the
+        MD5 worked out while sending, like `miniesptool.flash_file`"""
+        esp = self.esptool
+        filesize = os.stat(filename)[6]
+        if compress:
+            esp._check_compress()
+        esp._hash_start(verify and not md5)
+        try:
+            md5 = await self._write_file(filename, filesize, offset, compress) or md5
+        finally:
+            esp._hashing = None
+        if md5:
+            print("Verifying MD5sum ", md5)
+            calcd = await self.md5(offset, filesize)
+            if md5 != calcd:
+                raise RuntimeError("MD5 mismatch, calculated:", calcd)
+
+    async def _write_file(self, filename, filesize, offset, compress):
+        """Send a file for `flash_file`, returns the MD5 worked out on the way"""
+        esp = self.esptool
+        with open(filename, "rb") as file:
+            print("\nWriting", filename, "w/filesize:", filesize)
+            if compress:
+                compsize = 0
+                for _, chunk in esp._deflate(file, filesize):
+                    compsize += len(chunk)
+                    await asyncio.sleep(0)
+                await self.flash_defl_begin(size=filesize, compsize=compsize, offset=offset)
+                stamp = time.monotonic()
+                blocks = esp._deflated_blocks(file, filesize)
+                sent = 0
+                for seq, (block, timeout) in enumerate(blocks):
+                    await self.flash_defl_block(block, seq, timeout=timeout)
+                    if esp.progress is not None:
+                        sent += len(block)
+                        esp.progress(sent, compsize)
+            else:
+                await self.flash_begin(size=filesize, offset=offset)
+                stamp = time.monotonic()
+                for seq, block in enumerate(esp._raw_blocks(file, filesize)):
+                    await self.flash_block(block, seq, timeout=2)
+                    if esp.progress is not None:
+                        esp.progress(min((seq + 1) * esp._flash_write_size, filesize), filesize)
+            esp._wrote(filesize, stamp)
+            return esp._hash_finish(file, filesize)
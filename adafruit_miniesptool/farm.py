@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`adafruit_miniesptool.farm`
+====================================================
+
+Program a rack of ESP modules in parallel from a computer, one thread
+per module. Needs `concurrent.futures`, so CPython only.
+
+* Author(s): ladyada
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adafruit_miniesptool import miniesptool
+
+
+def _farm_session(target, images, flashsize, baudrate, compress, stub):
+    """Program one module for `flash_farm` and return its report"""
+    report = {
+        "target": target,
+        "chip": None,
+        "mac": None,
+        "seconds": 0,
+        "bytes": 0,
+        "bytes_per_second": 0,
+        "verified": None,
+        "error": None,
+    }
+    stamp = time.monotonic()
+    try:
+        esptool = miniesptool(*target, flashsize=flashsize)
+        esptool.sync()
+        report["chip"] = esptool.chip_name
+        report["mac"] = ":".join(f"{i:02x}" for i in esptool.mac_addr)
+        if stub:
+            esptool.load_stub(stub)
+        # The ESP8266 ROM can't change baud rate or calculate MD5s
+        capable = not esptool._limited_rom()
+        if baudrate and capable:
+            esptool.baudrate = baudrate
+        # Verify here rather than in flash_images so a mismatch is reported
+        # as a failed verification instead of an error
+        report["bytes"] = esptool.flash_images(
+            [image[:2] for image in images], compress=compress, verify=False
+        )
+        report["bytes_per_second"] = report["bytes"] / max(time.monotonic() - stamp, 0.001)
+        digests = [image for image in images if len(image) > 2 and image[2]]
+        if digests and capable:
+            report["verified"] = all(
+                esptool.md5(offset, os.stat(filename)[6]) == md5
+                for offset, filename, md5 in digests
+            )
+        esptool.reset()
+    except Exception as error:
+        # Whatever went wrong, keep it to this module
+        report["error"] = repr(error)
+    report["seconds"] = time.monotonic() - stamp
+    return report
+
+
+def flash_farm(
+    targets, images, *, flashsize, baudrate=None, compress=False, stub=None, workers=None
+):
+    """Program a rack of ESP modules at the same time from a computer with
+    several serial ports, running each module in its own thread. `targets`
+    is a list of (uart, gpio0_pin, reset_pin) tuples, one per module (a
+    `adafruit_miniesptool.transports.miniesptool_serial` provides all
+    three), and `images` is the plan passed to `miniesptool.flash_images`.
+    Each module is synced, identified, optionally given a `stub` and a
+    faster `baudrate`, programmed and verified against any MD5s in the
+    plan. Without a stub, ESP8266 modules stay at their first baud rate and
+    aren't verified. A failure only affects its own module. Returns a list
+    of report dicts in the same order as `targets`, with the chip name, MAC
+    address, duration, bytes written, bytes/s, verification result and any
+    error"""
+    if not targets:
+        return []
+    stamp = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers or len(targets)) as executor:
+        sessions = [
+            executor.submit(_farm_session, target, images, flashsize, baudrate, compress, stub)
+            for target in targets
+        ]
+        reports = [session.result() for session in sessions]
+    elapsed = time.monotonic() - stamp
+    total = sum(report["bytes"] for report in reports)
+    failed = sum(1 for report in reports if report["error"] or report["verified"] is False)
+    print(
+        f"Programmed {len(reports) - failed} of {len(reports)} modules, {total} bytes "
+        + f"in {elapsed:.2f}s ({total / max(elapsed, 0.001):.0f} bytes/s)"
+    )
+    return reports
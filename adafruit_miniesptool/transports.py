@@ -0,0 +1,148 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`adafruit_miniesptool.transports`
+====================================================
+
+Transports for talking to the ESP chip over something other than a
+busio.UART: a serial port on a computer through pyserial, or a socket.
+
+* Author(s): ladyada
+"""
+
+from adafruit_miniesptool import miniesptool_uart
+
+
+class _LinePin:
+    """A pin of `miniesptool_serial`, which looks enough like a
+    DigitalInOut for `miniesptool` and drives the port's control lines"""
+
+    def __init__(self, update):
+        self.direction = None
+        self._value = True
+        self._update = update
+
+    @property
+    def value(self):
+        """The level the pin is being driven to"""
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self._update()
+
+
+class miniesptool_serial(miniesptool_uart):
+    """A serial port on a computer, through pyserial. `port` is a device
+    name like "/dev/ttyUSB0" (ptys work too), a URL pyserial understands
+    such as "rfc2217://host:port" for a remote port, or an open
+    `serial.Serial`. `gpio0_pin` and `reset_pin` drive GPIO0 and EN
+    through DTR and RTS, with the auto-reset wiring of USB serial boards.
+    Pass all three to `miniesptool`::
+
+        from adafruit_miniesptool import miniesptool
+        from adafruit_miniesptool.transports import miniesptool_serial
+
+        port = miniesptool_serial("/dev/ttyUSB0")
+        esptool = miniesptool(port, port.gpio0_pin, port.reset_pin, flashsize=4 * 1024 * 1024)
+    """
+
+    def __init__(self, port, baudrate=115200):
+        if isinstance(port, str):
+            import serial  # Only needed on computers
+
+            port = serial.serial_for_url(port, baudrate=baudrate, timeout=0.1)
+        super().__init__(port)
+        self.gpio0_pin = _LinePin(self._update_lines)
+        self.reset_pin = _LinePin(self._update_lines)
+        self._update_lines()
+
+    def _update_lines(self):
+        """Set DTR and RTS for the pin levels. Boards cross the two lines
+        through transistors: RTS alone pulls EN low, DTR alone pulls GPIO0
+        low and both together change nothing. So while reset is held only
+        RTS is set, and GPIO0 goes low as reset is let go, which is when
+        the chip samples it"""
+        port = self._uart
+        if not self.reset_pin.value:
+            port.dtr = False
+            port.rts = True
+        else:
+            port.dtr = not self.gpio0_pin.value
+            port.rts = False
+
+    def close(self):
+        """Close the serial port"""
+        self._uart.close()
+
+
+class miniesptool_socket:
+    """A transport over a connected socket, for a raw TCP serial server
+    (like ser2net in raw mode) or a simulated chip. The socket needs
+    `recv_into`, `send` and `settimeout`, so CircuitPython socketpool
+    sockets work as well as CPython ones. The server end sets the real baud
+    rate, `baudrate` is only remembered, and the chip has to be reset some
+    other way, so pass pins that do that (or do nothing) to `miniesptool`"""
+
+    def __init__(self, sock, baudrate=115200):
+        self._sock = sock
+        self.baudrate = baudrate
+        self._timeout = None
+        self._buffer = bytearray(1024)
+        self._pending = b""  # Received but not read yet
+
+    def _receive(self, timeout):
+        """Wait up to `timeout` seconds for more data, returns the byte count"""
+        if timeout != self._timeout:
+            self._sock.settimeout(timeout)
+            self._timeout = timeout
+        try:
+            count = self._sock.recv_into(self._buffer)
+        except OSError:
+            # Timed out, or nothing there without blocking
+            return 0
+        if not count:
+            raise RuntimeError("Connection closed")
+        self._pending += self._buffer[:count]
+        return count
+
+    @property
+    def in_waiting(self):
+        """How many received bytes are waiting to be read"""
+        if not self._pending:
+            self._receive(0)
+        return len(self._pending)
+
+    def read(self, size):
+        """Read up to `size` bytes that have already arrived"""
+        data = self._pending[:size]
+        self._pending = self._pending[size:]
+        return data or None
+
+    def read_wait(self, timeout):
+        """Wait up to `timeout` seconds for data to arrive and return all
+        that has, or None if nothing did"""
+        if not self._pending:
+            self._receive(timeout)
+        return self.read(len(self._pending))
+
+    def write(self, data):
+        """Send all of `data`"""
+        view = memoryview(data)
+        sent = 0
+        while sent < len(view):
+            sent += self._sock.send(view[sent:])
+        return sent
+
+    def reset_input_buffer(self):
+        """Throw away anything received and not read yet"""
+        while self._receive(0):
+            pass
+        self._pending = b""
+
+    def close(self):
+        """Close the socket"""
+        self._sock.close()
@@ -0,0 +1,47 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+import asyncio
+
+import board
+import busio
+from digitalio import DigitalInOut
+
+from adafruit_miniesptool.aio import miniesptool_async
+
+# Override these if you are manually wiring. Otherwise, this will use ESP pins from board.
+tx = getattr(board, "ESP_TX", board.TX)
+rx = getattr(board, "ESP_RX", board.RX)
+resetpin = getattr(board, "ESP_RESET", board.D12)
+gpio0pin = getattr(board, "ESP_GPIO0", board.D10)
+
+uart = busio.UART(tx, rx, baudrate=115200, timeout=1)
+esptool = miniesptool_async(
+    uart, DigitalInOut(gpio0pin), DigitalInOut(resetpin), flashsize=4 * 1024 * 1024
+)
+
+
+async def program():
+    await esptool.sync()
+    print("Found:", await esptool.detect())
+    await esptool.set_baudrate(912600)
+    print("MAC ADDR: ", [hex(i) for i in esptool.mac_addr])
+    # Note: Make sure to use the LATEST nina-fw binary release!
+    await esptool.flash_file("NINA_W102-1.7.1.bin", 0x0, "dc81f0433dfba6de33c78b5c5911261d")
+    await esptool.reset()
+
+
+async def blink():
+    # Stands in for whatever else the board has to keep doing while flashing
+    while True:
+        print("Still running")
+        await asyncio.sleep(5)
+
+
+async def main():
+    blinker = asyncio.create_task(blink())
+    await program()
+    blinker.cancel()
+
+
+asyncio.run(main())
@@ -0,0 +1,358 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+"""Host overhead benchmarks for miniesptool, no ESP chip needed.
+Runs on a computer with Blinka installed, or on CircuitPython with a
+smaller simulated flash and image so they fit in RAM.
+
+`FakeROM` stands in for the UART and answers like the ESP8266, ESP32 and
+ESP32-C6 ROM bootloaders, so the whole flashing path can be timed (and
+checked) on a plain Linux box. Simulated flash times add the time the
+bytes would spend on the wire at the chosen baud rate to the measured
+host time; the chip's own erase and write time isn't modelled. After the
+timings, differential, sparse, compressed and repaired writes and reading
+flash back are checked end to end on the chips whose ROM supports them."""
+
+import os
+import struct
+import sys
+import time
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+try:
+    from hashlib import md5
+except ImportError:
+    from adafruit_hashlib import md5
+
+from adafruit_miniesptool import miniesptool, miniesptool_stats
+
+PAYLOAD_SIZE = 4096
+ROUNDS = 20
+SIM_BAUD = 921600
+if sys.implementation.name == "cpython":
+    FLASH_SIZE = 4 * 1024 * 1024
+    IMAGE_SIZE = 256 * 1024
+else:
+    # A microcontroller only has room for a small flash and image
+    FLASH_SIZE = 64 * 1024
+    IMAGE_SIZE = 32 * 1024
+BLANK_SECTOR = b"\xff" * 4096
+
+# Registers read while identifying each chip: the magic numbers that tell
+# the families apart and the efuses holding a made up MAC address
+FAKE_REGISTERS = {
+    "ESP8266": {
+        0x60000078: 0x00062000,
+        0x3FF00050: 0x12345600,
+        0x3FF00054: 0x00001234,
+    },
+    "ESP32": {
+        0x60000078: 0x15122500,
+        0x6001A004: 0xAABBCCDD,
+        0x6001A008: 0x00001122,
+    },
+    "ESP32-C6": {
+        0x40001000: 0x2CE0806F,
+        0x600B0844: 0x11223344,
+        0x600B0848: 0x00005566,
+    },
+}
+
+
+class FakePin:
+    """Looks enough like a DigitalInOut for miniesptool. Driving the
+    reset pin low resets the fake chip"""
+
+    def __init__(self, on_low=None):
+        self.direction = None
+        self._value = True
+        self._on_low = on_low
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        if not value and self._on_low:
+            self._on_low()
+
+
+class FakeROM:
+    """An in-process UART with a simulated ESP ROM bootloader on the other
+    end. Handles SYNC, READ_REG, SPI_ATTACH, SPI_SET_PARAMS,
+    FLASH_BEGIN/DATA/END, SPI_FLASH_MD5 and CHANGE_BAUDRATE, replying with
+    the status length each ROM uses. The ESP32 family ROMs also handle
+    FLASH_DEFL_BEGIN/DATA/END (where zlib can decompress a stream) and the
+    ESP32 ROM READ_FLASH_SLOW. Counts the bytes that cross the wire so the
+    link time can be worked out. Set `corrupt_at` to a flash address to
+    have the next write there go wrong, as a bad cable would"""
+
+    def __init__(self, chip="ESP32", flashsize=FLASH_SIZE):
+        self.chip = chip
+        self.flash = bytearray(flashsize)
+        self._erase(0, flashsize)
+        self.baudrate = 115200
+        self.wire_bytes = 0
+        self.corrupt_at = None
+        self._registers = FAKE_REGISTERS[chip]
+        self._out = bytearray()
+        self._in = bytearray()
+        self._write_offset = 0
+        self._seq = 0
+        self._decompressor = None
+
+    def _erase(self, offset, size):
+        """Set flash to 0xFF a sector at a time, without a big temporary"""
+        end = min(offset + size, len(self.flash))
+        for pos in range(offset, end, len(BLANK_SECTOR)):
+            count = min(len(BLANK_SECTOR), end - pos)
+            self.flash[pos : pos + count] = BLANK_SECTOR[:count]
+
+    def _program(self, data):
+        """Write `data` where the last FLASH_BEGIN left off"""
+        offset = self._write_offset
+        self.flash[offset : offset + len(data)] = data
+        if self.corrupt_at is not None and offset <= self.corrupt_at < offset + len(data):
+            self.flash[self.corrupt_at] ^= 0x01
+            self.corrupt_at = None
+        self._write_offset += len(data)
+
+    def reset(self):
+        """The chip restarts and forgets anything half received"""
+        self._out = bytearray()
+        self._in = bytearray()
+
+    def reset_input_buffer(self):
+        self._out = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self._out)
+
+    def read(self, size=None):
+        if size is None:
+            size = len(self._out)
+        data = bytes(self._out[:size])
+        self._out = self._out[size:]
+        return data or None
+
+    def write(self, data):
+        self.wire_bytes += len(data)
+        self._in += data
+        while True:
+            start = self._in.find(b"\xc0")
+            end = self._in.find(b"\xc0", start + 1) if start >= 0 else -1
+            if end < 0:
+                break
+            frame = bytes(self._in[start + 1 : end])
+            self._in = self._in[end + 1 :]
+            if frame:
+                self._handle(frame.replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb"))
+        return len(data)
+
+    def _respond(self, opcode, value=0, data=b"", error=0):
+        # The ESP8266 ROM sends 2 status bytes, the ESP32 family ROMs send 4
+        status_len = 2 if self.chip == "ESP8266" else 4
+        status = bytes([1 if error else 0, error]) + b"\x00" * (status_len - 2)
+        body = data + status
+        packet = struct.pack("<BBHI", 1, opcode, len(body), value) + body
+        packet = packet.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc")
+        self._out += b"\xc0" + packet + b"\xc0"
+        self.wire_bytes += len(packet) + 2
+
+    def _handle(self, frame):
+        direction, opcode, _, checksum = struct.unpack("<BBHI", frame[:8])
+        body = frame[8:]
+        if direction != 0:
+            return
+        if opcode == 0x08:  # SYNC, the ROM answers several times
+            for _ in range(8):
+                self._respond(opcode)
+        elif opcode == 0x0A:  # READ_REG
+            (register,) = struct.unpack("<I", body[:4])
+            self._respond(opcode, self._registers.get(register, 0))
+        elif opcode == 0x02 or opcode == 0x10 and self._can_inflate():
+            # FLASH_BEGIN or FLASH_DEFL_BEGIN, which erases for the inflated size
+            erase_size, _, _, offset = struct.unpack("<IIII", body[:16])
+            self._erase(offset, erase_size)
+            self._write_offset = offset
+            self._seq = 0
+            if opcode == 0x10:
+                self._decompressor = zlib.decompressobj()
+            self._respond(opcode)
+        elif opcode == 0x03 or opcode == 0x11 and self._decompressor:
+            # FLASH_DATA or FLASH_DEFL_DATA
+            size, seq = struct.unpack("<II", body[:8])
+            data = body[16 : 16 + size]
+            if miniesptool.checksum(data) != checksum:
+                self._respond(opcode, error=0x07)
+            elif seq != self._seq:
+                self._respond(opcode, error=0x08)
+            else:
+                if opcode == 0x11:
+                    data = self._decompressor.decompress(data)
+                self._program(data)
+                self._seq += 1
+                self._respond(opcode)
+        elif opcode == 0x0E and self.chip == "ESP32":  # READ_FLASH_SLOW
+            offset, size = struct.unpack("<II", body[:8])
+            self._respond(opcode, data=bytes(self.flash[offset : offset + size]))
+        elif opcode == 0x13:  # SPI_FLASH_MD5, as 32 hex characters
+            offset, size = struct.unpack("<II", body[:8])
+            digest = md5(self.flash[offset : offset + size]).hexdigest()
+            self._respond(opcode, data=digest.encode())
+        elif opcode in {0x04, 0x0B, 0x0D, 0x0F} or opcode == 0x12 and self._decompressor:
+            # FLASH_END, SPI_SET_PARAMS, SPI_ATTACH, CHANGE_BAUDRATE and FLASH_DEFL_END
+            self._respond(opcode)
+        else:
+            self._respond(opcode, error=0x05)
+
+    def _can_inflate(self):
+        """Only the ESP32 family ROMs take compressed data"""
+        return self.chip != "ESP8266" and hasattr(zlib, "decompressobj")
+
+
+def fake_esptool(chip):
+    """A synced miniesptool talking to a FakeROM"""
+    rom = FakeROM(chip)
+    esptool = miniesptool(rom, FakePin(), FakePin(rom.reset), flashsize=len(rom.flash))
+    esptool.sync()
+    return esptool, rom
+
+
+def check_flash(chip, rom, image, what):
+    """Make sure the simulated flash holds `image` after a write"""
+    if rom.flash[: len(image)] != image:
+        raise RuntimeError(f"{chip} {what} was not written correctly")
+
+
+def check_write_paths(chip, esptool, rom, image):
+    """Run the differential, sparse, compressed, repaired and read back
+    paths end to end, starting from `image` already in flash"""
+    sector = esptool.FLASH_SECTOR_SIZE
+    # Change one sector, only its 64 KB block should be sent again
+    changed = bytearray(image)
+    changed[sector : 2 * sector] = os.urandom(sector)
+    rom.wire_bytes = 0
+    esptool.flash_buffer(changed, diff=True)
+    check_flash(chip, rom, changed, "differential write")
+    print(f"  differential write sent {rom.wire_bytes} bytes for a {sector} byte change")
+    # Mostly padding, the blank sectors are only erased
+    sparse = bytearray(b"\xff") * len(image)
+    sparse[:sector] = image[:sector]
+    sparse[-sector:] = image[-sector:]
+    rom.wire_bytes = 0
+    esptool.flash_buffer(sparse, sparse=True)
+    check_flash(chip, rom, sparse, "sparse write")
+    print(f"  sparse write sent {rom.wire_bytes} bytes for {2 * sector} bytes of data")
+    if hasattr(zlib, "compressobj"):
+        rom.wire_bytes = 0
+        esptool.flash_buffer(sparse, compress=True)
+        check_flash(chip, rom, sparse, "compressed write")
+        print(f"  compressed write sent {rom.wire_bytes} bytes")
+    # A bit flipped on the way in is found by the MD5 and written again
+    rom.corrupt_at = len(image) // 2
+    esptool.flash_buffer(image)
+    check_flash(chip, rom, image, "repaired write")
+    if esptool.stats.repaired_bytes == 0:
+        raise RuntimeError(f"{chip} corrupted write was not repaired")
+    print(f"  repaired {esptool.stats.repaired_bytes} bytes after a corrupted write")
+    if chip == "ESP32":
+        readback = bytearray(2 * sector)
+        esptool.read_flash(0, len(readback), readback)
+        if readback != image[: len(readback)]:
+            raise RuntimeError(f"{chip} flash read back wrong")
+        print(f"  read back {len(readback)} bytes")
+
+
+def legacy_slip_encode(buffer):
+    """The original byte-at-a-time encoder, kept here for comparison"""
+    encoded = []
+    for b in buffer:
+        if b == 0xDB:
+            encoded += [0xDB, 0xDD]
+        elif b == 0xC0:
+            encoded += [0xDB, 0xDC]
+        else:
+            encoded += [b]
+    return bytearray(encoded)
+
+
+def legacy_checksum(data, state=0xEF):
+    """The original byte-at-a-time block checksum"""
+    for b in data:
+        state ^= b
+    return state
+
+
+def new_slip_encode_into(buffer, _frame=bytearray(2 * PAYLOAD_SIZE)):
+    """The encoder used when building packets, writing into a reused frame"""
+    return miniesptool._slip_encode_into(_frame, 0, buffer)
+
+
+def bench(function, payload):
+    """Return the average time in seconds for one call"""
+    stamp = time.monotonic()
+    for _ in range(ROUNDS):
+        function(payload)
+    return (time.monotonic() - stamp) / ROUNDS
+
+
+payloads = {
+    "random": os.urandom(PAYLOAD_SIZE),
+    "all 0xFF": b"\xff" * PAYLOAD_SIZE,
+    "escape heavy": b"\xc0\xdb" * (PAYLOAD_SIZE // 2),
+}
+encoders = {
+    "legacy slip_encode": legacy_slip_encode,
+    "slip_encode": miniesptool.slip_encode,
+    "_slip_encode_into": new_slip_encode_into,
+}
+
+print(f"SLIP encoding {PAYLOAD_SIZE} byte payloads, {ROUNDS} rounds each")
+for payload_name, payload in payloads.items():
+    print(payload_name)
+    for encoder_name, encoder in encoders.items():
+        elapsed = bench(encoder, payload)
+        rate = PAYLOAD_SIZE / elapsed / 1024 if elapsed else float("inf")
+        print(f"  {encoder_name:20s} {elapsed * 1e6:10.1f} us  {rate:10.1f} KB/s")
+
+print(f"Checksumming {PAYLOAD_SIZE} byte payloads, {ROUNDS} rounds each")
+for name, function in (("legacy checksum", legacy_checksum), ("checksum", miniesptool.checksum)):
+    elapsed = bench(function, payloads["random"])
+    print(f"  {name:20s} {elapsed * 1e6:10.1f} us")
+
+print(f"Flashing a {IMAGE_SIZE} byte image into a simulated ROM at {SIM_BAUD} baud")
+image = os.urandom(IMAGE_SIZE)
+for chip in FAKE_REGISTERS:
+    esptool, rom = fake_esptool(chip)
+    print(chip, "found as", esptool.chip_name)
+    if chip != "ESP8266":
+        esptool.baudrate = SIM_BAUD
+    block = bytes(esptool._flash_write_size)
+    esptool.flash_begin(size=ROUNDS * len(block))
+    stamp = time.monotonic()
+    for seq in range(ROUNDS):
+        esptool.flash_block(block, seq)
+    per_block = (time.monotonic() - stamp) / ROUNDS
+
+    rom.wire_bytes = 0
+    stamp = time.monotonic()
+    esptool.flash_buffer(image)
+    host = time.monotonic() - stamp
+    link = rom.wire_bytes * 10 / SIM_BAUD  # 8N1 is 10 bits a byte
+    check_flash(chip, rom, image, "image")
+    if chip != "ESP8266" and esptool.md5(0, IMAGE_SIZE) != md5(image).hexdigest():
+        raise RuntimeError(f"{chip} MD5 mismatch")
+    print(f"  host overhead per {len(block)} byte block {per_block * 1e6:10.1f} us")
+    print(f"  host time {host:.3f}s + link time {link:.3f}s = {host + link:.3f}s simulated")
+    if chip != "ESP8266":
+        # The ESP8266 ROM can't calculate the MD5s these paths rely on
+        esptool.stats = miniesptool_stats()
+        check_write_paths(chip, esptool, rom, image)
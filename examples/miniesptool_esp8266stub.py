@@ -0,0 +1,32 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+import time
+
+import board
+import busio
+from digitalio import DigitalInOut
+
+import adafruit_miniesptool
+
+print("ESP8266 stub prog")
+
+uart = busio.UART(board.TX, board.RX, baudrate=115200, timeout=1)
+resetpin = DigitalInOut(board.D5)
+gpio0pin = DigitalInOut(board.D6)
+esptool = adafruit_miniesptool.miniesptool(uart, gpio0pin, resetpin, flashsize=1024 * 1024)
+
+esptool.sync()
+print("Synced")
+print(esptool.chip_name)
+
+# Copy the flasher stub JSON for your chip from the esptool package
+# (esptool/targets/stub_flasher/stub_flasher_8266.json) onto CIRCUITPY
+esptool.load_stub("stub_flasher_8266.json")
+# With the stub running, the ESP8266 can change baud rate and check MD5s
+esptool.baudrate = 921600
+print("MAC ADDR: ", [hex(i) for i in esptool.mac_addr])
+# CircuitPython's zlib can't compress, so skip the 0xFF padding instead
+esptool.flash_file("esp8266/AT_firmware_1.6.2.0.bin", 0x0, sparse=True)
+esptool.reset()
+time.sleep(0.5)
@@ -0,0 +1,34 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+"""Program several ESP32 modules at once from a computer. Each module is on
+its own USB serial adapter with the usual auto-reset wiring, where DTR and
+RTS drive GPIO0 and EN through a pair of transistors. Needs pyserial."""
+
+from adafruit_miniesptool.farm import flash_farm
+from adafruit_miniesptool.transports import miniesptool_serial
+
+PORTS = ["/dev/ttyUSB0", "/dev/ttyUSB1", "/dev/ttyUSB2", "/dev/ttyUSB3"]
+
+targets = []
+for name in PORTS:
+    # Waiting for the chip blocks in the port's read, so each thread
+    # sleeps instead of keeping a CPU core busy
+    port = miniesptool_serial(name)
+    targets.append((port, port.gpio0_pin, port.reset_pin))
+
+reports = flash_farm(
+    targets,
+    [(0x0, "NINA_W102-1.7.1.bin", "dc81f0433dfba6de33c78b5c5911261d")],
+    flashsize=4 * 1024 * 1024,
+    baudrate=921600,
+)
+for name, report in zip(PORTS, reports):
+    print(
+        name,
+        report["chip"],
+        report["mac"],
+        f"{report['seconds']:.1f}s",
+        f"{report['bytes_per_second']:.0f} bytes/s",
+        "verified" if report["verified"] else report["error"] or "NOT verified",
+    )
@@ -0,0 +1,25 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+"""Run a test program from RAM over and over without writing to flash,
+handy for hardware-in-the-loop testing. The program is an ELF file or an
+app image built to run from IRAM/DRAM, copied onto CIRCUITPY."""
+
+import board
+import busio
+from digitalio import DigitalInOut
+
+import adafruit_miniesptool
+
+uart = busio.UART(board.TX, board.RX, baudrate=115200, timeout=1)
+resetpin = DigitalInOut(board.D5)
+gpio0pin = DigitalInOut(board.D6)
+esptool = adafruit_miniesptool.miniesptool(uart, gpio0pin, resetpin, flashsize=4 * 1024 * 1024)
+
+for run in range(3):
+    esptool.sync()
+    print("Found:", esptool.chip_name)
+    entry = esptool.load_ram("ram_test.elf")
+    print(f"Run {run + 1} started at 0x{entry:08x}")
+    # The test program has the UART now, show what it prints
+    print(uart.read(64))